@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library.settings')
+# Serve the read-heavy views as coroutines (settings.ASYNC_VIEWS)
+os.environ.setdefault('LIBSYS_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost so session and auth queries are counted too; inactive unless SQL_INSTRUMENTATION
+    'libsys.instrumentation.SqlInstrumentationMiddleware',
+    # Inactive unless DATABASE_REPLICAS is set
+    'libsys.db_routing.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,17 +85,94 @@ WSGI_APPLICATION = 'library.wsgi.application'
 #         'NAME': BASE_DIR / 'db.sqlite3',
 #     }
 # }
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'library',
-        'USER':'root',
-        'PASSWORD':'faith',
-        'HOST':'localhost',
-        'PORT':3306
+# Configured from LIBSYS_DB_* environment variables; the defaults are the local MySQL setup
+DB_ENGINE = os.environ.get('LIBSYS_DB_ENGINE', 'django.db.backends.mysql')
+
+
+def _database(**overrides):
+    database = {
+        'ENGINE': DB_ENGINE,
+        'NAME': os.environ.get('LIBSYS_DB_NAME', 'library'),
+        'USER': os.environ.get('LIBSYS_DB_USER', 'root'),
+        'PASSWORD': os.environ.get('LIBSYS_DB_PASSWORD', 'faith'),
+        'HOST': os.environ.get('LIBSYS_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('LIBSYS_DB_PORT', '3306'),
+        # Keep each worker's connection open between requests for this many seconds
+        # (0: a new connection per request), and check it still works before reusing it
+        'CONN_MAX_AGE': int(os.environ.get('LIBSYS_DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
+    if DB_ENGINE == 'django.db.backends.postgresql' and os.environ.get('LIBSYS_DB_POOL') == '1':
+        # psycopg's connection pool replaces persistent connections
+        database.update(CONN_MAX_AGE=0, OPTIONS={'pool': True})
+    database.update(overrides)
+    return database
+
+
+DATABASES = {'default': _database()}
+
+# Read replicas, comma separated: hosts, or database files for SQLite. They are
+# named replica_1, replica_2...; libsys.db_routing decides which reads use them.
+# Tests read them through the primary (TEST MIRROR).
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, os.environ.get('LIBSYS_DB_REPLICAS', '').split(',')), 1):
+    location = {'NAME': replica} if DB_ENGINE == 'django.db.backends.sqlite3' else {'HOST': replica}
+    DATABASES[f'replica_{number}'] = _database(**location, TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['libsys.db_routing.ReplicaRouter']
+# After a member's own rental, return or payment, their reads stay on the primary this long
+REPLICA_STICKY_SECONDS = int(os.environ.get('LIBSYS_REPLICA_STICKY_SECONDS', '10'))
+
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# "catalog" holds the versioned catalog pages; set CATALOG_CACHE_BACKEND/LOCATION to a
+# shared backend (e.g. django.core.cache.backends.redis.RedisCache) when running several workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': os.environ.get('CATALOG_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CATALOG_CACHE_LOCATION', 'catalog'),
+    },
+}
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_TIMEOUT = 600
+
+# "sessions" holds cached_db sessions and the logged-in User objects; like
+# "catalog", it has to be a shared backend when running several workers
+CACHES['sessions'] = {
+    'BACKEND': os.environ.get('SESSION_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+    'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', 'sessions'),
+}
+
+
+# Sessions
+# https://docs.djangoproject.com/en/5.1/topics/http/sessions/
+# LIBSYS_SESSION_MODE picks where sessions live:
+#   'db'             - a database row, read on every request (Django's default)
+#   'cached_db'      - read from the "sessions" cache, written through to the database
+#   'signed_cookies' - in the signed cookie itself; nothing stored server-side, but
+#                      a session can't be revoked before it expires except by logging out
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
 }
+SESSION_MODE = os.environ.get('LIBSYS_SESSION_MODE', 'cached_db')
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+SESSION_CACHE_ALIAS = 'sessions'
 
+# request.user comes from the "sessions" cache too (see libsys/auth_cache.py);
+# entries are dropped when the user or their profile is saved
+AUTHENTICATION_BACKENDS = ['libsys.auth_cache.CachedModelBackend']
+USER_CACHE_ALIAS = 'sessions'
+USER_CACHE_TIMEOUT = 300
 
 
 # Password validation
@@ -123,7 +205,6 @@ USE_I18N = True
 
 USE_TZ = True
 
-import os
 STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [
@@ -140,4 +221,58 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Number of books shown per page on the catalog and rent pages (?page_size= overrides it)
+CATALOG_PAGE_SIZE = 50
+# Default page size for the JSON catalog API
+API_PAGE_SIZE = 100
+# Members per page in the user list, and how long (seconds) its tab counts are cached
+MEMBER_PAGE_SIZE = 50
+MEMBER_COUNTS_CACHE_TIMEOUT = 60
+# Returned rentals per page in a member's rental history
+HISTORY_PAGE_SIZE = 20
+# archive_rentals moves rentals returned more than this many days ago out of RentBook
+RENTAL_ARCHIVE_AFTER_DAYS = 365
+# send_notifications: reminders go out this many days before a rental or membership ends
+NOTIFY_DUE_SOON_DAYS = 2
+NOTIFY_MEMBERSHIP_EXPIRY_DAYS = 7
+
+# Outgoing mail; LIBSYS_EMAIL_BACKEND selects a real backend (SMTP settings via EMAIL_*)
+EMAIL_BACKEND = os.environ.get('LIBSYS_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('LIBSYS_FROM_EMAIL', 'library@localhost')
+
+# Route the read-heavy views (search, genre, book details, rent list, JSON API) to
+# their async versions. asgi.py turns this on; under WSGI the sync views are
+# faster, since every async view would need its own event loop per request.
+ASYNC_VIEWS = os.environ.get('LIBSYS_ASYNC_VIEWS') == '1'
+
+# Per-request query counts, N+1 detection and slow-query logging (report on
+# admin_dashboard). Off by default; LIBSYS_SQL_INSTRUMENTATION=1 turns it on
+SQL_INSTRUMENTATION = os.environ.get('LIBSYS_SQL_INSTRUMENTATION') == '1'
+# Queries slower than this (ms) are logged to the 'libsys.sql' logger
+SQL_SLOW_QUERY_MS = 100
+# Same query shape this many times in one request is reported as a likely N+1
+SQL_N_PLUS_ONE_THRESHOLD = 5
+
+# Seconds before a worker rebuilds its in-memory search index from the database
+# (edits made in the same process are applied immediately through signals)
+SEARCH_INDEX_MAX_AGE = 300
+
+# Membership answers (libsys/membership.py) share the "sessions" cache, so every
+# worker sees a payment drop the member's entry. Seconds a "not a member" answer
+# is cached (active memberships are cached until their subscription_end_date)
+MEMBERSHIP_CACHE_ALIAS = 'sessions'
+MEMBERSHIP_CACHE_TIMEOUT = 300
+
+# How book PDFs are delivered by the book_pdf view: 'stream' (Django streams the
+# file with Range support), 'x-accel' (nginx X-Accel-Redirect to PDF_ACCEL_PREFIX,
+# which must map to an internal location aliasing MEDIA_ROOT) or 'x-sendfile'
+PDF_DELIVERY_MODE = 'stream'
+PDF_ACCEL_PREFIX = '/protected-media/'
+
+# Cover thumbnail sizes in CSS pixels (a 2x variant is generated for each)
+THUMBNAIL_SIZES = {
+    'small': (100, 150),
+    'medium': (300, 450),
+}
@@ -0,0 +1,236 @@
+# api.py
+"""Read-only JSON catalog API for kiosk and mobile clients.
+
+Responses carry a weak ETag built from the catalog version counter (see
+catalog_cache) and the request's query string. A poll with a matching
+If-None-Match gets a 304 after a single cache lookup, without touching the
+database; the response bodies themselves are cached per catalog version.
+
+The ``a``-prefixed views are the async versions routed under ASGI: a poll
+answered from the cache never leaves the event loop, and payloads are only
+built (in a thread) on a cache miss.
+"""
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
+
+from .catalog_cache import acached_catalog, acatalog_version, cached_catalog, catalog_version
+from .models import Author, Book
+from .pagination import get_page_size, keyset_paginate
+
+
+# Public field name -> ORM path
+BOOK_FIELDS = {
+    'id': 'id',
+    'book_id': 'book_id',
+    'name': 'name',
+    'author': 'author__name',
+    'author_id': 'author_id',
+    'genre': 'genre',
+    'rent': 'rent',
+    'status': 'status',
+    'copies': 'copies',
+    'rental_days': 'rental_days',
+}
+DEFAULT_BOOK_FIELDS = ['id', 'book_id', 'name', 'author', 'genre', 'rent', 'status', 'copies']
+
+AUTHOR_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+}
+
+AVAILABILITY_FIELDS = ['id', 'status', 'copies']
+
+# Most ids accepted by one availability request
+MAX_AVAILABILITY_IDS = 500
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _selected_fields(request, allowed, default):
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(default)
+    fields = [field.strip() for field in requested.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+    # The cursor needs the id even if the client didn't ask for it
+    return fields if 'id' in fields else ['id'] + fields
+
+
+def _page_payload(request, queryset, fields, mapping):
+    paths = [mapping[field] for field in fields]
+    page = keyset_paginate(
+        queryset.values(*paths),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        page_size=get_page_size(request, 'API_PAGE_SIZE'),
+    )
+    results = [{field: row[mapping[field]] for field in fields} for row in page]
+    query = request.GET.copy()
+    links = {}
+    for name, param, cursor in (('next', 'after', page.next_cursor), ('previous', 'before', page.prev_cursor)):
+        if cursor is None:
+            links[name] = None
+            continue
+        query.pop('after', None)
+        query.pop('before', None)
+        query[param] = cursor
+        links[name] = f'{request.path}?{query.urlencode()}'
+    return {'results': results, **links}
+
+
+def _book_filters(request):
+    # Checked here so a bad value is a 400, not a database error
+    filters = {}
+    for param, choices in (('genre', Book.GENRE_CHOICES), ('status', Book.STATUS_CHOICES)):
+        value = request.GET.get(param)
+        if value:
+            if value not in dict(choices):
+                raise BadRequest(f"Unknown {param}: {value}")
+            filters[param] = value
+    if request.GET.get('author_id'):
+        try:
+            filters['author_id'] = int(request.GET['author_id'])
+        except ValueError:
+            raise BadRequest("author_id must be an integer")
+    return filters
+
+
+def _books_payload(request):
+    fields = _selected_fields(request, BOOK_FIELDS, DEFAULT_BOOK_FIELDS)
+    queryset = Book.objects.filter(**_book_filters(request))
+    return _page_payload(request, queryset, fields, BOOK_FIELDS)
+
+
+def _authors_payload(request):
+    fields = _selected_fields(request, AUTHOR_FIELDS, list(AUTHOR_FIELDS))
+    return _page_payload(request, Author.objects.all(), fields, AUTHOR_FIELDS)
+
+
+def _book_payload(request, book_id):
+    fields = _selected_fields(request, BOOK_FIELDS, DEFAULT_BOOK_FIELDS)
+    row = Book.objects.filter(id=book_id).values(*[BOOK_FIELDS[f] for f in fields]).first()
+    if row is None:
+        return None
+    return {field: row[BOOK_FIELDS[field]] for field in fields}
+
+
+def _availability_payload(request):
+    try:
+        ids = [int(value) for value in request.GET.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        raise BadRequest("ids must be a comma-separated list of integers")
+    if len(ids) > MAX_AVAILABILITY_IDS:
+        raise BadRequest(f"At most {MAX_AVAILABILITY_IDS} ids per request")
+    rows = Book.objects.filter(id__in=ids).values(*AVAILABILITY_FIELDS)
+    return {'results': list(rows)}
+
+
+def _query_hash(request):
+    return hashlib.sha1(request.get_full_path().encode()).hexdigest()[:16]
+
+
+def _not_modified(request, etag):
+    # Unchanged catalog: answer 304 before doing any other work
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _renderer(request, build):
+    def render():
+        payload = build(request)
+        return None if payload is None else json.dumps(payload, default=str)
+    return render
+
+
+def _bad_request(error):
+    return HttpResponse(json.dumps({'error': str(error)}), status=400, content_type='application/json')
+
+
+def _body_response(body, etag):
+    if body is None:
+        raise Http404("Not found.")
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # Clients may keep the body but must revalidate (cheaply) before reusing it
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _json_response(request, name, build):
+    """Serve ``build(request)`` as JSON with a catalog-versioned weak ETag."""
+    query_hash = _query_hash(request)
+    etag = f'W/"{catalog_version()}-{query_hash}"'
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        body = cached_catalog('api', _renderer(request, build), name, query_hash)
+    except BadRequest as e:
+        return _bad_request(e)
+    return _body_response(body, etag)
+
+
+async def _ajson_response(request, name, build):
+    query_hash = _query_hash(request)
+    etag = f'W/"{await acatalog_version()}-{query_hash}"'
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        body = await acached_catalog('api', sync_to_async(_renderer(request, build)), name, query_hash)
+    except BadRequest as e:
+        return _bad_request(e)
+    return _body_response(body, etag)
+
+
+@require_safe
+def books(request):
+    return _json_response(request, 'books', _books_payload)
+
+
+@require_safe
+def book(request, book_id):
+    return _json_response(request, 'book', lambda r: _book_payload(r, book_id))
+
+
+@require_safe
+def authors(request):
+    return _json_response(request, 'authors', _authors_payload)
+
+
+@require_safe
+def availability(request):
+    return _json_response(request, 'availability', _availability_payload)
+
+
+@require_safe
+async def abooks(request):
+    return await _ajson_response(request, 'books', _books_payload)
+
+
+@require_safe
+async def abook(request, book_id):
+    return await _ajson_response(request, 'book', lambda r: _book_payload(r, book_id))
+
+
+@require_safe
+async def aauthors(request):
+    return await _ajson_response(request, 'authors', _authors_payload)
+
+
+@require_safe
+async def aavailability(request):
+    return await _ajson_response(request, 'availability', _availability_payload)
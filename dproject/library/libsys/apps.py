@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class LibsysConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'libsys'
+
+    def ready(self):
+        # Connect the search index, membership, user cache, catalog cache, rental summary, dashboard rollup
+        # and replica stickiness receivers
+        from . import auth_cache, catalog_cache, db_routing, history, inventory, membership, rollups, search  # noqa: F401
@@ -0,0 +1,62 @@
+# archive.py
+"""Returned rentals older than a cut-off live in ArchivedRental, not RentBook.
+
+RentBook then holds open rentals and recent returns only, so the tables the
+rental, overdue and borrowed pages scan stop growing with the library's age.
+The archive_rentals command moves rows in batches. Each batch copies the rows
+into ArchivedRental and deletes them from RentBook in one transaction.
+
+Archived rows keep their RentBook id. History readers use rental_history(),
+which returns both tables as querysets that keyset pagination (and the
+exports) read as one list.
+"""
+from datetime import timedelta
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from .models import ArchivedRental, RentBook
+
+
+# Columns copied from RentBook into ArchivedRental
+ARCHIVED_FIELDS = ('id', 'user_id', 'book_id', 'first_name', 'last_name', 'email',
+                   'rental_start_date', 'rental_end_date', 'returned_on', 'copy_id')
+
+
+def rental_history(closed_only=False, **filters):
+    """RentBook and ArchivedRental querysets filtered alike; pass both to keyset_paginate.
+
+    With ``closed_only`` the RentBook side leaves out rentals not yet returned
+    (every archived rental has been returned).
+    """
+    hot = RentBook.objects.filter(**filters)
+    if closed_only:
+        hot = hot.filter(returned_on__isnull=False)
+    return [hot, ArchivedRental.objects.filter(**filters)]
+
+
+def archive_batch(cutoff, batch_size, today):
+    """Move up to ``batch_size`` rentals returned before ``cutoff``; return how many moved."""
+    with transaction.atomic():
+        rows = list(
+            RentBook.objects.filter(returned_on__lt=cutoff).order_by('id')
+            .select_for_update().values(*ARCHIVED_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+        # ignore_conflicts: a row already archived by an earlier, interrupted run is kept as is
+        ArchivedRental.objects.bulk_create(
+            [ArchivedRental(archived_on=today, **row) for row in rows], ignore_conflicts=True)
+        # Deleted without signals: a returned rental no longer counts towards any
+        # dashboard rollup, and the member's RentalSummary still counts it
+        hot = RentBook.objects.filter(id__in=[row['id'] for row in rows])
+        hot._raw_delete(router.db_for_write(RentBook))
+        return len(rows)
+
+
+def archive_closed_rentals(older_than_days, batch_size=1000, today=None):
+    """Archive every rental returned more than ``older_than_days`` ago; yields each batch's count."""
+    today = today or timezone.now().date()
+    cutoff = today - timedelta(days=older_than_days)
+    while moved := archive_batch(cutoff, batch_size, today):
+        yield moved
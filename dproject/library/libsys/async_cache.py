@@ -0,0 +1,16 @@
+# async_cache.py
+"""Cache calls that are safe to make from async views.
+
+Django's async cache methods (aget, aset, ...) run the sync method in a worker
+thread. For the in-process local-memory backend that hop costs more than the
+lookup itself and nothing in it blocks, so it is called directly; every other
+backend (Redis, Memcached, database) goes through its async method.
+"""
+from django.core.cache.backends.locmem import LocMemCache
+
+
+async def acache_call(cache, method, *args, **kwargs):
+    """Await ``cache.<method>(*args, **kwargs)`` without blocking the event loop."""
+    if isinstance(cache, LocMemCache):
+        return getattr(cache, method)(*args, **kwargs)
+    return await getattr(cache, f'a{method}')(*args, **kwargs)
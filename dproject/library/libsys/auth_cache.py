@@ -0,0 +1,103 @@
+# auth_cache.py
+"""Cached request.user, so an authenticated page view needn't query for it.
+
+AuthenticationMiddleware asks the session's backend for the logged-in user on
+every request. CachedModelBackend answers from the USER_CACHE_ALIAS cache and
+only falls back to the database (User joined with its UserProfile) on a miss.
+Saving or deleting the User or its UserProfile drops the entry, so a password
+change is seen on the next request: Django compares the session's auth hash
+with the freshly loaded user and logs the old sessions out.
+
+With several workers the alias must point at a shared backend (Redis,
+Memcached), or one worker keeps serving a user another worker has changed.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .async_cache import acache_call
+from .models import UserProfile
+
+
+def user_cache():
+    return caches[getattr(settings, 'USER_CACHE_ALIAS', 'default')]
+
+
+def user_timeout():
+    return getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+
+
+def _cache_key(user_id):
+    return f'libsys:user:{user_id}'
+
+
+def _user_query(user_id):
+    # The profile comes along in the same query; most member pages read it
+    return User.objects.select_related('userprofile').filter(pk=user_id)
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user() is served from the cache."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        # ModelBackend.authenticate, but the profile is joined into the user lookup
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        user = User.objects.select_related('userprofile').filter(**{User.USERNAME_FIELD: username}).first()
+        if user is None:
+            # Hash anyway, so a missing user takes as long as a wrong password
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        cache = user_cache()
+        key = _cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = _user_query(user_id).first()
+            if user is None:
+                return None
+            cache.set(key, user, user_timeout())
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        cache = user_cache()
+        key = _cache_key(user_id)
+        user = await acache_call(cache, 'get', key)
+        if user is None:
+            user = await _user_query(user_id).afirst()
+            if user is None:
+                return None
+            await acache_call(cache, 'set', key, user, user_timeout())
+        return user if self.user_can_authenticate(user) else None
+
+
+def invalidate_user(user_id):
+    key = _cache_key(user_id)
+    user_cache().delete(key)
+    # Again after commit, in case a concurrent request re-cached the old row meanwhile
+    transaction.on_commit(lambda: user_cache().delete(key))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # login() saves last_login alone; nothing a request reads, so keep the cached user
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def user_profile_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
@@ -0,0 +1,119 @@
+# catalog_cache.py
+"""Versioned cache for catalog querysets and rendered fragments.
+
+Every key includes the current catalog version. Saving or deleting a Book or
+Author (and taking a copy in a rental) bumps the version, so readers keep
+getting cached pages until the catalog actually changes and then miss once.
+Old entries are never deleted explicitly; they age out of the cache.
+
+The cache alias comes from settings.CATALOG_CACHE_ALIAS. Local memory is fine
+for a single process; with several workers point the alias at a shared backend
+(Redis, Memcached) so a bump in one worker is seen by all of them.
+
+With read replicas, a page rebuilt right after a bump could cache rows the
+replica hasn't caught up on under the new version. So for
+REPLICA_STICKY_SECONDS after each bump, pages are rebuilt from the primary.
+
+The ``a``-prefixed functions are the same lookups for async views.
+"""
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .async_cache import acache_call
+from .db_routing import read_routing
+from .models import Author, Book
+
+
+VERSION_KEY = 'libsys:catalog:version'
+# Present while the replicas may still lag the last bump
+FRESH_KEY = 'libsys:catalog:fresh'
+
+_MISSING = object()
+
+
+def catalog_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def catalog_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 600)
+
+
+def catalog_version():
+    cache = catalog_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # add() so two workers starting at once agree on the first value
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+async def acatalog_version():
+    cache = catalog_cache()
+    version = await acache_call(cache, 'get', VERSION_KEY)
+    if version is None:
+        await acache_call(cache, 'add', VERSION_KEY, 1, timeout=None)
+        version = await acache_call(cache, 'get', VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    cache = catalog_cache()
+    if getattr(settings, 'DATABASE_REPLICAS', ()):
+        # Before the bump, so whoever sees the new version also sees this
+        cache.set(FRESH_KEY, True, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key missing (evicted or never read): any fresh value invalidates old keys
+        cache.add(VERSION_KEY, 2, timeout=None)
+
+
+def bump_catalog_version_on_commit():
+    # Readers must not re-cache the old rows before the writing transaction commits
+    transaction.on_commit(bump_catalog_version)
+
+
+def catalog_key(name, *parts):
+    return ':'.join(['libsys:catalog', str(catalog_version()), name, *map(str, parts)])
+
+
+def _refill_routing(fresh):
+    return read_routing(pinned=True) if fresh else nullcontext()
+
+
+def cached_catalog(name, build, *parts):
+    """Return the cached value for ``name``/``parts`` at the current version, building it on a miss."""
+    cache = catalog_cache()
+
+    def refill():
+        with _refill_routing(cache.get(FRESH_KEY)):
+            return build()
+
+    return cache.get_or_set(catalog_key(name, *parts), refill, catalog_timeout())
+
+
+async def acached_catalog(name, build, *parts):
+    """Async cached_catalog(); ``build`` is a coroutine function, awaited only on a miss."""
+    cache = catalog_cache()
+    key = ':'.join(['libsys:catalog', str(await acatalog_version()), name, *map(str, parts)])
+    value = await acache_call(cache, 'get', key, _MISSING)
+    if value is _MISSING:
+        with _refill_routing(await acache_call(cache, 'get', FRESH_KEY)):
+            value = await build()
+        await acache_call(cache, 'add', key, value, catalog_timeout())
+    return value
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version_on_commit()
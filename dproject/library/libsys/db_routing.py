@@ -0,0 +1,117 @@
+# db_routing.py
+"""Read replicas: which queries may read from them, and read-your-writes.
+
+settings.DATABASE_REPLICAS lists replica aliases (empty by default, and then
+everything here is a no-op). During a request, ReplicaRouter sends reads of
+the catalog and report models (REPLICA_MODELS) to a random replica. Everything
+else, and every write, uses the primary. Reports that scan rentals or members
+opt in explicitly with ``queryset.using(read_replica())``.
+
+A replica may lag the primary, so:
+
+* once a request has written anything, its remaining reads use the primary;
+* after a member's own rental, return or payment, ReplicaRoutingMiddleware
+  sets a short-lived cookie and their requests read from the primary until it
+  expires (REPLICA_STICKY_SECONDS), so they see the change on the next page.
+
+Outside a request (management commands, shell) the router sends reads to the
+primary; only the explicit read_replica() calls use a replica there.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Payment, RentBook
+
+
+# Models whose reads can tolerate replication lag: the catalog and the precomputed reports
+REPLICA_MODELS = {
+    'libsys.author', 'libsys.book', 'libsys.mediablob',
+    'libsys.dashboardrollup', 'libsys.overduesnapshot', 'libsys.overduesnapshotrow', 'libsys.archivedrental',
+}
+
+STICKY_COOKIE = 'libsys_primary'
+
+
+class _Scope:
+    __slots__ = ('pinned', 'sticky')
+
+    def __init__(self, pinned):
+        self.pinned = pinned   # reads go to the primary for the rest of this scope
+        self.sticky = False    # ... and for the member's next requests too
+
+
+_scope = ContextVar('libsys_read_routing', default=None)
+
+
+@contextmanager
+def read_routing(pinned=False):
+    """Route reads through the replicas for the duration of the block (one request)."""
+    scope = _Scope(pinned)
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def read_replica():
+    """Alias for a read that tolerates lag: a replica, or the primary if none or if pinned."""
+    replicas = getattr(settings, 'DATABASE_REPLICAS', ())
+    scope = _scope.get()
+    if not replicas or (scope is not None and scope.pinned):
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+
+def stick_to_primary():
+    """Read from the primary for the rest of this request and the member's next few requests."""
+    scope = _scope.get()
+    if scope is not None:
+        scope.pinned = scope.sticky = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _scope.get() is None or model._meta.label_lower not in REPLICA_MODELS:
+            return DEFAULT_DB_ALIAS
+        return read_replica()
+
+    def db_for_write(self, model, **hints):
+        scope = _scope.get()
+        if scope is not None:
+            scope.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'DATABASE_REPLICAS', ()):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+
+    def __call__(self, request):
+        with read_routing(pinned=STICKY_COOKIE in request.COOKIES) as scope:
+            response = self.get_response(request)
+        if scope.sticky:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
+
+@receiver(post_save, sender=RentBook)
+@receiver(post_save, sender=Payment)
+def member_wrote(sender, created, **kwargs):
+    # Returns are recorded with queryset.update(); rentals.return_rental calls stick_to_primary() itself
+    if created:
+        stick_to_primary()
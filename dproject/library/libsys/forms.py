@@ -3,6 +3,7 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.core.validators import EmailValidator
 from .models import Book, Author
+from .thumbnails import ensure_thumbnails
 import re
 
 # Validator for user ID (must contain both letters and numbers)
@@ -112,9 +113,17 @@ class BookForm(forms.ModelForm):
             'status': forms.Select(choices=[
                 ('Available', 'Available'),
                 ('Unavailable', 'Unavailable'),
+                ('Withdrawn', 'Withdrawn'),
             ]),
         }
 
+    def save(self, commit=True):
+        book = super().save(commit=commit)
+        # Build the cover thumbnails now rather than on the first page view
+        if commit and book.cover_image and 'cover_image' in self.changed_data:
+            ensure_thumbnails(book.cover_image)
+        return book
+
 class PaymentForm(forms.Form):
     PAYMENT_METHOD_CHOICES = [
         ('upi', 'UPI'),
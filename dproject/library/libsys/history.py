@@ -0,0 +1,72 @@
+# history.py
+"""A member's rentals as the profile page shows them.
+
+Current rentals are one query with the book joined. Past rentals are keyset
+paginated, newest first, over RentBook and the archive (archive.rental_history),
+so a member with hundreds of returned books still costs two short queries per
+page. RentalSummary holds each member's counts and
+last rental date. Creating or deleting a RentBook updates it through signals,
+and return_rental() calls rental_closed() for the returns it records with
+queryset.update().
+"""
+from django.db.models import Case, F, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .archive import rental_history
+from .models import RentalSummary, RentBook
+from .pagination import paginate_request
+
+
+# Book columns the profile page renders
+BOOK_FIELDS = ('book__id', 'book__name', 'book__cover_image', 'book__pdf')
+RENTAL_FIELDS = ('id', 'book_id', 'rental_start_date', 'rental_end_date', 'returned_on', *BOOK_FIELDS)
+
+
+def current_rentals(user):
+    return list(
+        RentBook.objects.filter(user=user, returned_on__isnull=True)
+        .select_related('book').only(*RENTAL_FIELDS).order_by('rental_end_date', 'id')
+    )
+
+
+def past_rentals(request, user):
+    """One page of ``user``'s returned rentals, most recent first."""
+    querysets = [queryset.select_related('book').only(*RENTAL_FIELDS)
+                 for queryset in rental_history(closed_only=True, user=user)]
+    return paginate_request(request, querysets, 'HISTORY_PAGE_SIZE', descending=True)
+
+
+def rental_summary(user):
+    """The member's RentalSummary; an unsaved, all-zero one if they never rented."""
+    summary = RentalSummary.objects.filter(user=user).first()
+    return summary or RentalSummary(user=user)
+
+
+def _update_summary(user_id, total=0, open_rentals=0, rented_on=None, create=True):
+    changes = {'total_rentals': F('total_rentals') + total, 'open_rentals': F('open_rentals') + open_rentals}
+    if rented_on is not None:
+        # Keep the latest date; a rental recorded late doesn't move it back
+        changes['last_rented_on'] = Case(
+            When(last_rented_on__gte=rented_on, then=F('last_rented_on')), default=rented_on)
+    if not RentalSummary.objects.filter(user_id=user_id).update(**changes) and create:
+        RentalSummary.objects.get_or_create(user_id=user_id)
+        RentalSummary.objects.filter(user_id=user_id).update(**changes)
+
+
+def rental_closed(user_id):
+    # For returns recorded with queryset.update() (see rentals.return_rental)
+    _update_summary(user_id, open_rentals=-1, create=False)
+
+
+@receiver(post_save, sender=RentBook)
+def rental_saved(sender, instance, created, **kwargs):
+    if created:
+        _update_summary(instance.user_id, total=1, open_rentals=int(instance.returned_on is None),
+                        rented_on=instance.rental_start_date)
+
+
+@receiver(post_delete, sender=RentBook)
+def rental_deleted(sender, instance, **kwargs):
+    # Never creates a row: when the user is being deleted, their summary may already be gone
+    _update_summary(instance.user_id, total=-1, open_rentals=-int(instance.returned_on is None), create=False)
@@ -0,0 +1,151 @@
+# instrumentation.py
+"""Opt-in per-request SQL instrumentation.
+
+SqlInstrumentationMiddleware wraps every database connection with an
+execute_wrapper for the length of a request. It counts queries and DB time,
+and groups statements by fingerprint: the SQL with literals and IN lists
+collapsed. A fingerprint that repeats SQL_N_PLUS_ONE_THRESHOLD times in one
+request is flagged as a likely N+1 (typically a template following a foreign
+key per row). Queries slower than SQL_SLOW_QUERY_MS are logged.
+
+Totals are aggregated per URL name in process memory and shown on
+admin_dashboard. Each worker keeps its own figures. Turn it on with
+SQL_INSTRUMENTATION (the LIBSYS_SQL_INSTRUMENTATION=1 environment variable);
+otherwise the middleware removes itself at startup.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger('libsys.sql')
+
+_IN_LIST = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)', re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+\b')
+_WHITESPACE = re.compile(r'\s+')
+
+# Longest SQL kept in the report and the logs
+MAX_SQL_LENGTH = 300
+# sql_stats key for requests that matched no URL pattern
+UNRESOLVED = '<unresolved>'
+
+
+def fingerprint(sql):
+    """Reduce ``sql`` to its shape, so the same query with other values groups together."""
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def _shorten(sql):
+    return sql if len(sql) <= MAX_SQL_LENGTH else sql[:MAX_SQL_LENGTH] + '...'
+
+
+class QueryRecorder:
+    """execute_wrapper that records every query run during one request."""
+
+    def __init__(self, slow_ms):
+        self.slow_ms = slow_ms
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            self.fingerprints[fingerprint(sql)] += 1
+            if elapsed * 1000 >= self.slow_ms:
+                logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, _shorten(sql))
+
+    def repeated(self, threshold):
+        return {sql: count for sql, count in self.fingerprints.items() if count >= threshold}
+
+
+class SqlStats:
+    """Query totals per URL name, shared by every thread of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+
+    def record(self, url_name, recorder, threshold):
+        repeated = recorder.repeated(threshold)
+        with self._lock:
+            stats = self.views.setdefault(url_name, {
+                'requests': 0, 'queries': 0, 'db_time': 0.0, 'max_queries': 0, 'n_plus_one': Counter(),
+            })
+            stats['requests'] += 1
+            stats['queries'] += recorder.count
+            stats['db_time'] += recorder.duration
+            stats['max_queries'] = max(stats['max_queries'], recorder.count)
+            for sql, count in repeated.items():
+                # Keep the worst repeat count seen for each pattern
+                stats['n_plus_one'][sql] = max(stats['n_plus_one'][sql], count)
+        return repeated
+
+    def report(self):
+        """Per-view summaries, the views spending the most DB time first."""
+        with self._lock:
+            rows = [
+                {
+                    'url_name': url_name,
+                    'requests': stats['requests'],
+                    'avg_queries': stats['queries'] / stats['requests'],
+                    'max_queries': stats['max_queries'],
+                    'avg_db_ms': stats['db_time'] * 1000 / stats['requests'],
+                    'total_db_ms': stats['db_time'] * 1000,
+                    'n_plus_one': [(_shorten(sql), count) for sql, count in stats['n_plus_one'].most_common(5)],
+                }
+                for url_name, stats in self.views.items()
+            ]
+        return sorted(rows, key=lambda row: row['total_db_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self.views = {}
+
+
+# Process-wide figures shown on admin_dashboard
+sql_stats = SqlStats()
+
+
+class SqlInstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'SQL_SLOW_QUERY_MS', 100)
+        self.threshold = getattr(settings, 'SQL_N_PLUS_ONE_THRESHOLD', 5)
+
+    def __call__(self, request):
+        recorder = QueryRecorder(self.slow_ms)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        # Unmatched paths (404 scans) share one key so they can't grow sql_stats without bound
+        url_name = match.view_name if match else UNRESOLVED
+        repeated = sql_stats.record(url_name, recorder, self.threshold)
+        for sql, count in repeated.items():
+            logger.warning("Likely N+1 in %s: %d x %s", url_name, count, _shorten(sql))
+
+        # Visible in the browser's network panel
+        response['Server-Timing'] = f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"'
+        return response
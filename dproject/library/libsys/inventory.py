@@ -0,0 +1,127 @@
+# inventory.py
+"""Per-copy inventory: allocating, releasing and counting BookCopy rows.
+
+Renters claim a BookCopy row each instead of all decrementing Book.copies, so
+concurrent renters of one title lock different rows. Book.copies and
+Book.status stay as a cache of the Available copies: they are recounted right
+after each rental or return commits, in a short transaction of their own.
+"""
+import random
+
+from django.db import connections, router, transaction
+from django.db.models import Count
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .catalog_cache import bump_catalog_version
+from .models import Book, BookCopy
+from .rollups import book_status_changed
+
+
+# Candidates tried per round when the database can't skip locked rows
+CLAIM_BATCH = 10
+
+
+def allocate_copy(book_id):
+    """Mark one Available copy of ``book_id`` Rented and return its id, or None if none is left.
+
+    Call inside a transaction. With SELECT ... FOR UPDATE SKIP LOCKED every
+    renter locks a different copy instead of waiting for the one another renter
+    holds. Backends without it (SQLite) claim optimistically: a conditional
+    UPDATE on a shuffled handful of candidates until one succeeds.
+    """
+    available = BookCopy.objects.filter(book_id=book_id, status='Available')
+    if connections[router.db_for_write(BookCopy)].features.has_select_for_update_skip_locked:
+        copy_id = available.select_for_update(skip_locked=True).values_list('id', flat=True).first()
+        if copy_id is not None:
+            BookCopy.objects.filter(id=copy_id).update(status='Rented')
+        return copy_id
+
+    while True:
+        candidates = list(available.values_list('id', flat=True)[:CLAIM_BATCH])
+        if not candidates:
+            return None
+        random.shuffle(candidates)
+        for copy_id in candidates:
+            if BookCopy.objects.filter(id=copy_id, status='Available').update(status='Rented'):
+                return copy_id
+
+
+def release_copy(book_id, copy_id):
+    """Put a rented copy back on the shelf."""
+    if copy_id is None:
+        # Rentals from before per-copy inventory: the copy comes back as a new row
+        BookCopy.objects.create(book_id=book_id)
+        return True
+    return BookCopy.objects.filter(id=copy_id, status='Rented').update(status='Available') == 1
+
+
+def shelf_status(status, copies):
+    # Available/Unavailable follow the copy count; an admin's Withdrawn is kept
+    if status == 'Withdrawn':
+        return status
+    return 'Available' if copies > 0 else 'Unavailable'
+
+
+def refresh_availability(book_id):
+    """Recount Book.copies/status from the book's Available copies; a Withdrawn title stays Withdrawn."""
+    with transaction.atomic():
+        # Lock the book so two refreshes can't both count the same status flip
+        row = Book.objects.select_for_update().filter(id=book_id).values_list('genre', 'status', 'copies').first()
+        if row is None:
+            return
+        genre, old_status, old_copies = row
+        copies = BookCopy.objects.filter(book_id=book_id, status='Available').count()
+        status = shelf_status(old_status, copies)
+        if (status, copies) != (old_status, old_copies):
+            Book.objects.filter(id=book_id).update(copies=copies, status=status)
+            if status != old_status:
+                book_status_changed(genre, old_status, status)
+    bump_catalog_version()
+
+
+def refresh_availability_on_commit(book_id):
+    # Outside the renter's transaction, so the book row is only locked briefly.
+    # The rental has committed by then; if the recount fails (lock timeout) it is
+    # logged, and the book's next rental or return recounts it again.
+    transaction.on_commit(lambda: refresh_availability(book_id), robust=True)
+
+
+def sync_copies(book_ids):
+    """Add or remove Available copies so each book has as many as its ``copies`` field says.
+
+    Used when Book.copies is set directly: the add/edit book forms and
+    import_books. Rented copies are never touched. Book.status follows the new
+    count, so a restocked title becomes Available again.
+    """
+    books = {book_id: (copies, status, genre) for book_id, copies, status, genre
+             in Book.objects.filter(id__in=book_ids).values_list('id', 'copies', 'status', 'genre')}
+    wanted = {book_id: copies for book_id, (copies, _, _) in books.items()}
+    have = dict(
+        BookCopy.objects.filter(book_id__in=book_ids, status='Available')
+        .values_list('book_id').annotate(n=Count('id')).order_by()
+    )
+    new = []
+    for book_id, copies in wanted.items():
+        missing = copies - have.get(book_id, 0)
+        if missing > 0:
+            new.extend(BookCopy(book_id=book_id) for _ in range(missing))
+        elif missing < 0:
+            surplus = BookCopy.objects.filter(book_id=book_id, status='Available').order_by('-id')[:-missing]
+            BookCopy.objects.filter(id__in=list(surplus.values_list('id', flat=True))).delete()
+    BookCopy.objects.bulk_create(new, batch_size=1000)
+
+    flips = {}
+    for book_id, (copies, status, genre) in books.items():
+        new_status = shelf_status(status, copies)
+        if new_status != status:
+            flips.setdefault(new_status, []).append(book_id)
+            book_status_changed(genre, status, new_status)
+    for status, ids in flips.items():
+        Book.objects.filter(id__in=ids).update(status=status)
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'copies' in update_fields:
+        sync_copies([instance.pk])
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from libsys.archive import archive_closed_rentals
+
+
+class Command(BaseCommand):
+    help = (
+        "Move rentals returned more than --older-than days ago from RentBook into the archive "
+        "table, in batches. Safe to run while the site is up, and to re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=settings.RENTAL_ARCHIVE_AFTER_DAYS,
+                            help="Archive rentals returned more than this many days ago "
+                                 "(default: settings.RENTAL_ARCHIVE_AFTER_DAYS)")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rentals moved per transaction")
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 0:
+            raise CommandError("--older-than can't be negative")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        started = time.perf_counter()
+        moved = 0
+        for count in archive_closed_rentals(options['older_than'], options['batch_size']):
+            moved += count
+            self.stdout.write(f"{moved} rentals archived, {moved / (time.perf_counter() - started):.0f} rows/s")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {moved} rentals returned over {options['older_than']} days ago "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,74 @@
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+
+USERNAME_PREFIX = 'bench-login-'
+PASSWORD = 'bench-login-pw1'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the login view: POST /login/ through the full middleware stack and report "
+        "logins per second and queries per login, broken down by statement type. Creates "
+        f"{USERNAME_PREFIX}* users and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help="Accounts to cycle through")
+        parser.add_argument('--logins', type=int, default=500, help="Logins to measure")
+        parser.add_argument('--real-hasher', action='store_true',
+                            help="Keep the configured password hasher. By default a fast (insecure) "
+                                 "hasher is used so the database work isn't hidden behind PBKDF2")
+        parser.add_argument('--keep', action='store_true', help="Don't delete the benchmark users")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['logins'] < 1:
+            raise CommandError("--users and --logins must be at least 1")
+        hashers = None if options['real_hasher'] else ['django.contrib.auth.hashers.MD5PasswordHasher']
+        with override_settings(PASSWORD_HASHERS=hashers) if hashers else nullcontext():
+            usernames = self.create_users(options['users'])
+            try:
+                self.measure(usernames, options['logins'])
+            finally:
+                if not options['keep']:
+                    User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def create_users(self, count):
+        usernames = [f'{USERNAME_PREFIX}{i}' for i in range(count)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        for username in usernames:
+            if username not in existing:
+                User.objects.create_user(username=username, password=PASSWORD)
+        return usernames
+
+    def measure(self, usernames, logins):
+        url = reverse('login')
+        # 'localhost' is allowed with DEBUG and an empty ALLOWED_HOSTS
+        client = Client(HTTP_HOST='localhost')
+        statements = Counter()
+        failed = 0
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for i in range(logins):
+                client.cookies.clear()
+                response = client.post(url, {'userid': usernames[i % len(usernames)], 'password': PASSWORD})
+                if response.status_code != 302:
+                    failed += 1
+            elapsed = time.perf_counter() - started
+        for query in queries.captured_queries:
+            statements[query['sql'].split(None, 1)[0].upper()] += 1
+
+        per_login = len(queries.captured_queries) / logins
+        breakdown = ', '.join(f"{count / logins:.1f} {kind}" for kind, count in statements.most_common())
+        self.stdout.write(
+            f"{logins / elapsed:.0f} logins/s, {per_login:.1f} queries per login ({breakdown}), {failed} failed"
+        )
+
@@ -0,0 +1,103 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from libsys.inventory import refresh_availability, sync_copies
+from libsys.models import Author, Book, RentBook
+from libsys.rentals import rent_book_for
+
+
+USERNAME_PREFIX = 'bench-rental-'
+BOOK_ID = 'BENCH-RENT'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent renting: --threads renters race for --copies copies of one title. "
+        "Reports rentals per second and checks that no more copies were rented than exist. "
+        f"Creates a {BOOK_ID} book and {USERNAME_PREFIX}* users and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help="Concurrent renters")
+        parser.add_argument('--attempts', type=int, default=25, help="Rental attempts per renter")
+        parser.add_argument('--copies', type=int, default=100, help="Copies of the contested title")
+        parser.add_argument('--keep', action='store_true', help="Don't delete the benchmark book and users")
+
+    def handle(self, *args, **options):
+        if min(options['threads'], options['attempts'], options['copies']) < 1:
+            raise CommandError("--threads, --attempts and --copies must be at least 1")
+        book = self.create_book(options['copies'])
+        users = self.create_users(options['threads'])
+        try:
+            self.measure(book, users, options)
+        finally:
+            if not options['keep']:
+                RentBook.objects.filter(book=book).delete()
+                Book.objects.filter(id=book.id).delete()
+                User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def create_book(self, copies):
+        author, _ = Author.objects.get_or_create(name='Benchmark Author')
+        RentBook.objects.filter(book__book_id=BOOK_ID).delete()
+        Book.objects.filter(book_id=BOOK_ID).delete()
+        book = Book.objects.create(book_id=BOOK_ID, name='Benchmark Title', author=author, genre='Comic',
+                                   rent='100', status='Available', copies=copies)
+        sync_copies([book.id])
+        return Book.objects.only('id', 'status', 'rental_days').get(id=book.id)
+
+    def create_users(self, count):
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        return User.objects.bulk_create(User(username=f'{USERNAME_PREFIX}{i}') for i in range(count))
+
+    def measure(self, book, users, options):
+        rented = []
+        errors = []
+        retries = 0
+        start = threading.Barrier(len(users))
+
+        def renter(user):
+            nonlocal retries
+            try:
+                start.wait()
+                for _ in range(options['attempts']):
+                    while True:
+                        try:
+                            rental = rent_book_for(user, book)
+                            break
+                        except OperationalError:
+                            # SQLite reports lock contention instead of waiting
+                            retries += 1
+                            time.sleep(0.001)
+                    if rental is not None:
+                        rented.append(rental.id)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=renter, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        for exc in errors:
+            self.stderr.write(f"Renter failed: {exc!r}")
+        # The last recount may have lost a lock race; settle it before checking
+        refresh_availability(book.id)
+        book.refresh_from_db(fields=['copies'])
+        recorded = RentBook.objects.filter(book_id=book.id).count()
+        self.stdout.write(
+            f"{len(rented) / elapsed:.0f} rentals/s: {len(rented)} rentals in {elapsed:.2f}s, "
+            f"{len(users) * options['attempts']} attempts, {retries} lock retries"
+        )
+        if recorded > options['copies'] or len(rented) != recorded or book.copies != options['copies'] - recorded:
+            raise CommandError(
+                f"Oversold: {recorded} rentals recorded for {options['copies']} copies, {book.copies} left")
+        self.stdout.write(self.style.SUCCESS(f"No overselling: {recorded} of {options['copies']} copies rented"))
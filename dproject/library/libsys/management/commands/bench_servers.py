@@ -0,0 +1,206 @@
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from libsys.models import Book
+
+
+def default_paths():
+    # The genre page uses the genre with the most books, so it measures the listing rather than a 404
+    busiest = Book.objects.values('genre').annotate(n=Count('id')).order_by('-n').first()
+    genre = busiest['genre'] if busiest else Book.GENRE_CHOICES[0][0]
+    return ['/search-authors/?query=to', f'/genre/{genre}/', '/api/books/?page_size=20']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response; return (status, keep_alive)."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+class Target:
+    """Counters for one server under test."""
+
+    def __init__(self, name, url):
+        parts = urlsplit(url)
+        self.name = name
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.latencies = []
+        self.errors = 0
+
+
+async def worker(target, paths, deadline, cookie, offset):
+    reader = writer = None
+    i = offset
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        request = f'GET {path} HTTP/1.1\r\nHost: {target.host}\r\n'
+        if cookie:
+            request += f'Cookie: {cookie}\r\n'
+        request = (request + '\r\n').encode()
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(target.host, target.port)
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            target.errors += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        target.latencies.append(time.perf_counter() - started)
+        if status >= 500:
+            target.errors += 1
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(target, paths, concurrency, duration, cookie):
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(worker(target, paths, deadline, cookie, n) for n in range(concurrency)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare WSGI and ASGI throughput and latency: drive each server with many concurrent "
+        "keep-alive connections and report requests/s, p50 and p99. With --serve, gunicorn "
+        "(WSGI) and uvicorn (ASGI) are started locally on free ports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', default=[], metavar='NAME=URL',
+                            help="Server to measure, e.g. wsgi=http://127.0.0.1:8000 (repeatable)")
+        parser.add_argument('--serve', action='store_true',
+                            help="Start gunicorn and uvicorn for this project and measure both")
+        parser.add_argument('--workers', type=int, default=2, help="Worker processes for --serve")
+        parser.add_argument('--threads', type=int, default=8, help="Threads per gunicorn worker for --serve")
+        parser.add_argument('--path', action='append', dest='paths', metavar='PATH',
+                            help="Path to request, cycled per connection (repeatable)")
+        parser.add_argument('--concurrency', type=int, default=200, help="Open connections per server")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds of load per server")
+        parser.add_argument('--warmup', type=float, default=2, help="Seconds of unmeasured load first")
+        parser.add_argument('--cookie', help="Cookie header to send, e.g. sessionid=... for login-only views")
+
+    def start_servers(self, options):
+        missing = [tool for tool in ('gunicorn', 'uvicorn') if shutil.which(tool) is None]
+        if missing:
+            raise CommandError(f"--serve needs {' and '.join(missing)} installed")
+        wsgi_port, asgi_port = free_port(), free_port()
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'library.settings'))
+        workers = str(options['workers'])
+        # Each server gets the views it would route in production (settings.ASYNC_VIEWS)
+        commands = {
+            'wsgi': ('0', wsgi_port, ['gunicorn', 'library.wsgi:application', '--bind', f'127.0.0.1:{wsgi_port}',
+                                 '--workers', workers, '--threads', str(options['threads']),
+                                 '--worker-class', 'gthread', '--log-level', 'warning']),
+            'asgi': ('1', asgi_port, ['uvicorn', 'library.asgi:application', '--host', '127.0.0.1',
+                                 '--port', str(asgi_port), '--workers', workers, '--log-level', 'warning']),
+        }
+        processes, targets = [], []
+        for name, (async_views, port, command) in commands.items():
+            processes.append(subprocess.Popen(command, cwd=settings.BASE_DIR,
+                                              env=dict(env, LIBSYS_ASYNC_VIEWS=async_views)))
+            targets.append(Target(name, f'http://127.0.0.1:{port}'))
+        for target in targets:
+            self.wait_for(target)
+        return processes, targets
+
+    def wait_for(self, target, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection((target.host, target.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"{target.name} server did not start on port {target.port}")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or default_paths()
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1")
+
+        processes = []
+        targets = []
+        for spec in options['target']:
+            name, sep, url = spec.partition('=')
+            if not sep:
+                raise CommandError(f"--target must look like NAME=URL, got {spec!r}")
+            targets.append(Target(name, url))
+        if options['serve']:
+            processes, served = self.start_servers(options)
+            targets += served
+        if not targets:
+            raise CommandError("Give at least one --target, or --serve")
+
+        try:
+            for target in targets:
+                self.measure(target, paths, options)
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+
+    def measure(self, target, paths, options):
+        concurrency, cookie = options['concurrency'], options['cookie']
+        if options['warmup'] > 0:
+            asyncio.run(run_load(target, paths, concurrency, options['warmup'], cookie))
+            target.latencies, target.errors = [], 0
+
+        asyncio.run(run_load(target, paths, concurrency, options['duration'], cookie))
+        latencies = sorted(target.latencies)
+        self.stdout.write(
+            f"{target.name}: {len(latencies) / options['duration']:.0f} req/s, "
+            f"p50 {percentile(latencies, 0.50) * 1000:.1f} ms, p99 {percentile(latencies, 0.99) * 1000:.1f} ms, "
+            f"{target.errors} errors ({concurrency} connections, {len(latencies)} requests)"
+        )
+        sys.stdout.flush()
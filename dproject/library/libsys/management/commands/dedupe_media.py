@@ -0,0 +1,110 @@
+import os
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from libsys.models import Book, MediaBlob
+from libsys.storage import MEDIA_FIELDS, blob_name, content_hash, is_blob_name, media_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Move existing covers and PDFs to content-addressed names (merging identical files), "
+        "rebuild MediaBlob reference counts and, with --gc, delete unreferenced files."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gc', action='store_true', help="Delete files no Book refers to")
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help="Leave files younger than this alone during --gc (uploads in flight)")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without changing it")
+
+    def handle(self, *args, **options):
+        self.storage = media_storage()
+        self.dry_run = options['dry_run']
+
+        self.migrate_legacy_files()
+        counts = self.reconcile_refcounts()
+        if options['gc']:
+            self.collect_garbage(counts, options['grace_minutes'] * 60)
+
+    def _hash_file(self, name):
+        with self.storage.open(name, 'rb') as f:
+            return content_hash(f)
+
+    def migrate_legacy_files(self):
+        renamed = {}
+        moved = merged = saved_bytes = 0
+        rows = Book.objects.values_list('id', *MEDIA_FIELDS).iterator(chunk_size=2000)
+        for book_id, *names in rows:
+            updates = {}
+            for field, name in zip(MEDIA_FIELDS, names):
+                if not name or is_blob_name(name):
+                    continue
+                if name not in renamed:
+                    if not self.storage.exists(name):
+                        self.stderr.write(f"Missing file for book {book_id}: {name}")
+                        continue
+                    new_name = blob_name(os.path.dirname(name), self._hash_file(name), name)
+                    if self.storage.exists(new_name):
+                        # Same bytes already stored: drop this copy
+                        merged += 1
+                        saved_bytes += self.storage.size(name)
+                        if not self.dry_run:
+                            self.storage.delete(name)
+                    else:
+                        moved += 1
+                        if not self.dry_run:
+                            os.makedirs(os.path.dirname(self.storage.path(new_name)), exist_ok=True)
+                            os.replace(self.storage.path(name), self.storage.path(new_name))
+                    renamed[name] = new_name
+                updates[field] = renamed[name]
+            if updates and not self.dry_run:
+                # Plain UPDATE: reference counts are rebuilt afterwards in one pass
+                Book.objects.filter(id=book_id).update(**updates)
+
+        self.stdout.write(f"Moved {moved} files to content-addressed names, merged {merged} "
+                          f"duplicates ({saved_bytes} bytes freed)")
+
+    def reconcile_refcounts(self):
+        counts = Counter()
+        for names in Book.objects.values_list(*MEDIA_FIELDS).iterator(chunk_size=2000):
+            counts.update(name for name in names if name)
+        if self.dry_run:
+            return counts
+
+        existing = dict(MediaBlob.objects.values_list('name', 'refcount'))
+        MediaBlob.objects.bulk_create(
+            [MediaBlob(name=name, refcount=count) for name, count in counts.items() if name not in existing],
+            batch_size=1000,
+        )
+        stale = [name for name, refcount in existing.items() if refcount != counts.get(name, 0)]
+        for name in stale:
+            MediaBlob.objects.filter(name=name).update(refcount=counts.get(name, 0))
+        self.stdout.write(f"Reference counts: {len(counts)} files in use, {len(stale)} counts corrected")
+        return counts
+
+    def _stored_files(self, directory):
+        # Walk one upload directory, yielding storage names
+        root = self.storage.path(directory)
+        for dirpath, _dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                yield os.path.relpath(full_path, self.storage.location).replace(os.sep, '/'), full_path
+
+    def collect_garbage(self, counts, grace_seconds):
+        cutoff = time.time() - grace_seconds
+        deleted = freed = 0
+        directories = {Book._meta.get_field(field).upload_to.rstrip('/') for field in MEDIA_FIELDS}
+        for directory in directories:
+            for name, full_path in self._stored_files(directory):
+                if counts.get(name) or os.path.getmtime(full_path) > cutoff:
+                    continue
+                deleted += 1
+                freed += os.path.getsize(full_path)
+                if not self.dry_run:
+                    os.remove(full_path)
+        if not self.dry_run:
+            MediaBlob.objects.filter(refcount__lte=0).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unreferenced files ({freed} bytes freed)"))
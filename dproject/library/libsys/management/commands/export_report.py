@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from libsys.exports import FORMATS, REPORTS, stream_report
+
+
+class Command(BaseCommand):
+    help = "Stream the borrowed, overdue or members report as CSV or JSONL to a file or stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument('report', choices=sorted(REPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help="Gzip the output")
+        parser.add_argument('--output', '-o', help="File to write (default: stdout)")
+
+    def handle(self, *args, **options):
+        chunks = stream_report(options['report'], options['format'], options['gzip'])
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        else:
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
@@ -0,0 +1,175 @@
+import csv
+import json
+import sys
+import time
+from collections import OrderedDict
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+
+from libsys.catalog_cache import bump_catalog_version
+from libsys.inventory import sync_copies
+from libsys.models import Author, Book
+from libsys.rollups import rebuild_rollups
+
+
+# Columns read from each row; author is the author's name
+FIELDS = ('book_id', 'name', 'author', 'genre', 'rent', 'status', 'copies', 'rental_days')
+UPDATE_FIELDS = ['name', 'author', 'genre', 'rent', 'status', 'copies', 'rental_days']
+
+
+class AuthorCache:
+    """Bounded name -> id map so memory stays flat however many authors the feed has."""
+
+    def __init__(self, max_size=50000):
+        self.max_size = max_size
+        self.ids = OrderedDict()
+
+    def get(self, name):
+        author_id = self.ids.get(name)
+        if author_id is not None:
+            self.ids.move_to_end(name)
+        return author_id
+
+    def put(self, name, author_id):
+        self.ids[name] = author_id
+        self.ids.move_to_end(name)
+        if len(self.ids) > self.max_size:
+            self.ids.popitem(last=False)
+
+    def resolve(self, names):
+        """Map every name to an author id: one IN query, one bulk_create for new names."""
+        missing = {name for name in names if self.get(name) is None}
+        if missing:
+            # Lowest id wins if the table already has duplicate names
+            for name, author_id in Author.objects.filter(name__in=missing).order_by('-id').values_list('name', 'id'):
+                self.put(name, author_id)
+            new = [name for name in missing if self.get(name) is None]
+            if new:
+                Author.objects.bulk_create([Author(name=name) for name in new])
+                # Not every backend returns ids from bulk_create, so read them back
+                for name, author_id in Author.objects.filter(name__in=new).order_by('-id').values_list('name', 'id'):
+                    self.put(name, author_id)
+        return {name: self.get(name) for name in names}
+
+
+class Command(BaseCommand):
+    help = "Bulk import or update books from a CSV or JSONL file, matching existing books on book_id."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (with a header row) or JSONL file; '-' reads stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format (default: from the file extension)")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per transaction")
+
+    def read_rows(self, stream, fmt):
+        if fmt == 'csv':
+            yield from csv.DictReader(stream)
+        else:
+            # Parsed in clean_row so one bad line is skipped like any other bad row
+            for line in stream:
+                if line.strip():
+                    yield line
+
+    def clean_rows(self, rows):
+        # Invalid rows are reported and skipped rather than aborting the import
+        for line, row in enumerate(rows, 1):
+            try:
+                yield self.clean_row(row)
+            except (ValueError, TypeError) as e:
+                self.skipped += 1
+                self.stderr.write(f"Row {line}: {e}")
+
+    def clean_row(self, row):
+        if isinstance(row, str):
+            row = json.loads(row)
+            if not isinstance(row, dict):
+                raise ValueError("expected a JSON object")
+        values = {field: str(row.get(field, '') or '').strip() for field in FIELDS}
+        if not values['book_id'] or not values['name'] or not values['author']:
+            raise ValueError("book_id, name and author are required")
+        # MySQL would truncate these silently or fail the whole batch
+        for field, max_length in (('book_id', Book._meta.get_field('book_id').max_length),
+                                  ('name', Book._meta.get_field('name').max_length),
+                                  ('author', Author._meta.get_field('name').max_length)):
+            if len(values[field]) > max_length:
+                raise ValueError(f"{field} longer than {max_length} characters")
+        for field, choices in (('genre', Book.GENRE_CHOICES), ('rent', Book.RENT_CHOICES),
+                               ('status', Book.STATUS_CHOICES)):
+            if values[field] not in dict(choices):
+                raise ValueError(f"invalid {field} {values[field]!r}")
+        values['copies'] = int(values['copies'] or 1)
+        values['rental_days'] = int(values['rental_days'] or 7)
+        if values['copies'] < 0:
+            raise ValueError(f"invalid copies {values['copies']}")
+        if values['rental_days'] < 1:
+            raise ValueError(f"invalid rental_days {values['rental_days']}")
+        return values
+
+    def import_batch(self, rows, authors):
+        # Last row wins if a book_id repeats within the batch
+        by_book_id = {row['book_id']: row for row in rows}
+        with transaction.atomic():
+            author_ids = authors.resolve({row['author'] for row in by_book_id.values()})
+            counts = self.save_books(by_book_id, author_ids)
+            # Match each book's shelf copies to its imported copy count
+            sync_copies(list(Book.objects.filter(book_id__in=list(by_book_id)).values_list('id', flat=True)))
+            return counts
+
+    def save_books(self, by_book_id, author_ids):
+        # Only used to report new vs updated; the upsert itself doesn't need it
+        existing = Book.objects.filter(book_id__in=list(by_book_id)).count()
+        books = [
+            Book(
+                book_id=book_id,
+                name=row['name'],
+                author_id=author_ids[row['author']],
+                genre=row['genre'],
+                rent=row['rent'],
+                status=row['status'],
+                copies=row['copies'],
+                rental_days=row['rental_days'],
+            )
+            for book_id, row in by_book_id.items()
+        ]
+        # INSERT ... ON CONFLICT (book_id) DO UPDATE, or ON DUPLICATE KEY UPDATE on MySQL,
+        # which takes no conflict target (book_id is the only unique key besides id)
+        options = {'update_fields': UPDATE_FIELDS}
+        if connections[router.db_for_write(Book)].features.supports_update_conflicts_with_target:
+            options['unique_fields'] = ['book_id']
+        Book.objects.bulk_create(books, update_conflicts=True, **options)
+        return len(books) - existing, existing
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        authors = AuthorCache()
+        self.skipped = 0
+        created = updated = 0
+        started = time.perf_counter()
+        try:
+            rows = self.clean_rows(self.read_rows(stream, fmt))
+            while batch := list(islice(rows, batch_size)):
+                new, changed = self.import_batch(batch, authors)
+                created += new
+                updated += changed
+                done = created + updated
+                self.stdout.write(f"{done} books imported, {done / (time.perf_counter() - started):.0f} rows/s")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        # bulk_create doesn't send post_save, so invalidate the catalog cache and recount books here
+        bump_catalog_version()
+        rebuild_rollups('books')
+        elapsed = time.perf_counter() - started
+        total = created + updated
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {total} books ({created} new, {updated} updated, {self.skipped} skipped) "
+            f"in {elapsed:.1f}s, {total / elapsed if elapsed else 0:.0f} rows/s"
+        ))
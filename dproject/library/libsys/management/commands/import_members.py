@@ -0,0 +1,176 @@
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from libsys.models import UserProfile
+from libsys.rollups import rebuild_rollups
+
+
+# Columns read from each row; password and the subscription dates may be empty
+FIELDS = ('username', 'email', 'first_name', 'last_name', 'password',
+          'subscription_start_date', 'subscription_end_date')
+
+
+def _init_worker():
+    # Pool processes started with "spawn" (macOS, Windows) begin without Django set up
+    django.setup()
+
+
+def _hash(password):
+    # An empty password gives an unusable one: the member must reset it before logging in
+    return make_password(password or None)
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk register members from a CSV or JSONL file. Passwords are hashed in a process pool "
+        "on every core; users and their profiles are inserted with bulk_create, without per-row "
+        "signals. Existing usernames are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (with a header row) or JSONL file; '-' reads stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format (default: from the file extension)")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Members per transaction")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Hashing processes (default: one per core)")
+        parser.add_argument('--subscription-days', type=int,
+                            help="Subscribe members from today for this many days, unless their row "
+                                 "gives subscription dates")
+
+    def read_rows(self, stream, fmt):
+        if fmt == 'csv':
+            yield from csv.DictReader(stream)
+        else:
+            for line in stream:
+                if line.strip():
+                    yield line
+
+    def clean_rows(self, rows):
+        # Invalid rows are reported and skipped rather than aborting the import
+        for line, row in enumerate(rows, 1):
+            try:
+                yield self.clean_row(row)
+            except (ValueError, TypeError) as e:
+                self.skipped += 1
+                self.stderr.write(f"Row {line}: {e}")
+
+    def clean_row(self, row):
+        if isinstance(row, str):
+            row = json.loads(row)
+            if not isinstance(row, dict):
+                raise ValueError("expected a JSON object")
+        values = {field: str(row.get(field, '') or '').strip() for field in FIELDS}
+        if not values['username']:
+            raise ValueError("username is required")
+        if len(values['username']) > User._meta.get_field('username').max_length:
+            raise ValueError(f"username {values['username']!r} is too long")
+        for field in ('subscription_start_date', 'subscription_end_date'):
+            values[field] = date.fromisoformat(values[field]) if values[field] else None
+        if values['subscription_start_date'] and not values['subscription_end_date']:
+            raise ValueError("subscription_start_date needs a subscription_end_date")
+        return values
+
+    def subscription(self, row):
+        """(is_subscribed, start, end) for one member."""
+        if row['subscription_end_date']:
+            return True, row['subscription_start_date'] or self.today, row['subscription_end_date']
+        if self.subscription_days:
+            return True, self.today, self.today + timedelta(days=self.subscription_days)
+        return False, None, None
+
+    def new_rows(self, rows):
+        # The first row for a username wins; existing members are left alone
+        by_username = {}
+        for row in rows:
+            if row['username'] in self.seen or row['username'] in by_username:
+                self.skipped += 1
+                self.stderr.write(f"Duplicate username {row['username']!r} skipped")
+            else:
+                by_username[row['username']] = row
+        self.seen.update(by_username)
+        existing = set(User.objects.filter(username__in=list(by_username)).values_list('username', flat=True))
+        self.existing += len(existing)
+        return [row for username, row in by_username.items() if username not in existing]
+
+    def hash_passwords(self, pool, rows):
+        passwords = [row['password'] for row in rows]
+        # map() submits everything now; the hashes are collected after the previous batch is saved
+        return pool.map(_hash, passwords, chunksize=max(1, len(passwords) // (self.workers * 4)))
+
+    def save_members(self, rows, hashes):
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(username=row['username'], email=row['email'], first_name=row['first_name'],
+                     last_name=row['last_name'], password=password)
+                for row, password in zip(rows, hashes)
+            ])
+            # Not every backend returns ids from bulk_create, so read them back
+            user_ids = dict(User.objects.filter(username__in=[row['username'] for row in rows])
+                            .values_list('username', 'id'))
+            profiles = []
+            for row in rows:
+                subscribed, start, end = self.subscription(row)
+                profiles.append(UserProfile(user_id=user_ids[row['username']], is_subscribed=subscribed,
+                                            subscription_start_date=start, subscription_end_date=end))
+            UserProfile.objects.bulk_create(profiles)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+        self.workers = options['workers']
+        if self.workers < 1:
+            raise CommandError("--workers must be at least 1")
+        self.subscription_days = options['subscription_days']
+        if self.subscription_days is not None and self.subscription_days < 1:
+            raise CommandError("--subscription-days must be at least 1")
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        self.today = timezone.now().date()
+        self.skipped = self.existing = 0
+        self.seen = set()
+        created = 0
+        started = time.perf_counter()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as pool:
+                rows = self.clean_rows(self.read_rows(stream, fmt))
+                pending = None
+                # Hash the next batch while the current one is being inserted
+                while True:
+                    chunk = list(islice(rows, batch_size))
+                    batch = self.new_rows(chunk)
+                    hashing = (batch, self.hash_passwords(pool, batch)) if batch else None
+                    if pending:
+                        self.save_members(pending[0], list(pending[1]))
+                        created += len(pending[0])
+                        self.stdout.write(f"{created} members imported, "
+                                          f"{created / (time.perf_counter() - started):.0f} rows/s")
+                    if not chunk:
+                        break
+                    pending = hashing
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        # bulk_create doesn't send post_save, so recount subscribers here
+        rebuild_rollups('subscribers')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {created} members ({self.existing} already existed, {self.skipped} skipped) "
+            f"in {elapsed:.1f}s, {created / elapsed if elapsed else 0:.0f} rows/s"
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from libsys.models import DashboardRollup
+from libsys.rollups import SECTIONS, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the admin dashboard rollups from the base tables in one pass. Run it once after "
+        "migrating, after bulk changes that skip signals, or to repair drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('sections', nargs='*', help=f"Sections to rebuild (default: all of {', '.join(SECTIONS)})")
+
+    def handle(self, *args, **options):
+        sections = options['sections'] or list(SECTIONS)
+        unknown = [section for section in sections if section not in SECTIONS]
+        if unknown:
+            raise CommandError(f"Unknown sections: {', '.join(unknown)}")
+
+        before = dict(DashboardRollup.objects.values_list('key', 'value'))
+        totals = rebuild_rollups(*sections)
+
+        # Report the totals that were wrong
+        prefixes = tuple(SECTIONS[section][0] for section in sections)
+        keys = sorted(key for key in set(before) | set(totals) if key.startswith(prefixes))
+        corrected = 0
+        for key in keys:
+            if before.get(key, 0) != totals.get(key, 0):
+                corrected += 1
+                self.stdout.write(f"{key}: {before.get(key, 0)} -> {totals.get(key, 0)}")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(totals)} rollups, {corrected} corrected"))
@@ -0,0 +1,47 @@
+import time
+from datetime import date
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+
+from libsys.notifications import NOTICES, send_notices
+
+
+class Command(BaseCommand):
+    help = (
+        "Email members about rentals due soon, overdue rentals and memberships about to end. "
+        "Each notice is sent once: re-running the command skips everything already sent."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*',
+                            help=f"Notices to send (default: all of {', '.join(NOTICES)})")
+        parser.add_argument('--date', help="Send as of this date, YYYY-MM-DD (defaults to today)")
+        parser.add_argument('--batch-size', type=int, default=100, help="Messages per send_mass_mail call")
+        parser.add_argument('--dry-run', action='store_true', help="Count the notices without sending them")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        unknown = set(options['kinds']) - set(NOTICES)
+        if unknown:
+            raise CommandError(f"Unknown notice: {', '.join(sorted(unknown))}")
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+
+        started = time.perf_counter()
+        # One connection for every batch of every kind
+        connection = get_connection()
+        connection.open()
+        try:
+            for kind in options['kinds'] or NOTICES:
+                sent = send_notices(kind, connection, today, options['batch_size'], options['dry_run'])
+                verb = "would send" if options['dry_run'] else "sent"
+                self.stdout.write(f"{kind}: {verb} {sent}")
+        finally:
+            connection.close()
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from libsys.overdue import build_overdue_snapshot
+
+
+class Command(BaseCommand):
+    help = "Write the daily overdue snapshot (per-user and per-book totals) for the admin overdue page."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Snapshot date as YYYY-MM-DD (defaults to today)")
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+
+        snapshot = build_overdue_snapshot(today)
+        self.stdout.write(self.style.SUCCESS(
+            f"Overdue snapshot for {snapshot.snapshot_date}: {snapshot.overdue_rentals} rentals, "
+            f"{snapshot.overdue_users} users, {snapshot.overdue_books} books"
+        ))
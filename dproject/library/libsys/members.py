@@ -0,0 +1,57 @@
+# members.py
+"""Queries behind the member directory (user_list_view).
+
+The listing joins each profile's user in the same query and is keyset
+paginated, so a page costs the same however many members there are. The
+all/subscribed/unsubscribed tab counts come from one conditional aggregate,
+cached for MEMBER_COUNTS_CACHE_TIMEOUT seconds: they may lag a new
+registration by that long, which is fine for a directory.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import UserProfile
+
+
+STATUSES = ('all', 'subscribed', 'unsubscribed')
+
+# What the directory shows; the rest of the user row is left out
+DIRECTORY_FIELDS = ('id', 'is_subscribed', 'user__first_name', 'user__last_name', 'user__email')
+
+
+def _search_filter(search):
+    if not search:
+        return Q()
+    return (Q(user__first_name__icontains=search) | Q(user__last_name__icontains=search)
+            | Q(user__email__icontains=search) | Q(user__username__icontains=search))
+
+
+def member_directory(status='all', search=''):
+    """Profiles (with their users joined) for one tab, optionally filtered by name or email."""
+    profiles = UserProfile.objects.select_related('user').only(*DIRECTORY_FIELDS).filter(_search_filter(search))
+    if status == 'subscribed':
+        return profiles.filter(is_subscribed=True)
+    if status == 'unsubscribed':
+        return profiles.filter(is_subscribed=False)
+    return profiles
+
+
+def _counts_key(search):
+    digest = hashlib.sha1(search.lower().encode()).hexdigest()[:16]
+    return f'libsys:member_counts:{digest}'
+
+
+def member_counts(search=''):
+    """{'all': n, 'subscribed': n, 'unsubscribed': n} from a single aggregate query."""
+    def count():
+        totals = UserProfile.objects.filter(_search_filter(search)).aggregate(
+            all=Count('id'),
+            subscribed=Count('id', filter=Q(is_subscribed=True)),
+        )
+        totals['unsubscribed'] = totals['all'] - totals['subscribed']
+        return totals
+
+    return cache.get_or_set(_counts_key(search), count, getattr(settings, 'MEMBER_COUNTS_CACHE_TIMEOUT', 60))
@@ -0,0 +1,109 @@
+# membership.py
+"""Membership status answered from UserProfile and cached per user.
+
+activate_plan/payment_view keep UserProfile.subscription_end_date current, so
+that date is the source of truth. It is cached until the subscription runs
+out and dropped whenever the user's Payment or UserProfile is saved.
+ahas_active_membership() is the same check for async views.
+
+The answers live in the MEMBERSHIP_CACHE_ALIAS cache. With several workers the
+alias must point at a shared backend (Redis, Memcached): a payment handled by
+one worker only drops that worker's entry if the cache is per-process, and the
+others keep refusing a member who has just paid.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .async_cache import acache_call
+from .models import Payment, UserProfile
+
+
+# Cache marker for "no active subscription" (None can't be told apart from a miss)
+NO_MEMBERSHIP = ''
+
+
+def membership_cache():
+    return caches[getattr(settings, 'MEMBERSHIP_CACHE_ALIAS', 'default')]
+
+
+def _cache_key(user_id):
+    return f'libsys:membership:{user_id}'
+
+
+def _timeout(end_date):
+    if not end_date:
+        return getattr(settings, 'MEMBERSHIP_CACHE_TIMEOUT', 300)
+    # Expire right after the last day of the subscription
+    expires = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return max(1, int((expires - timezone.now()).total_seconds()))
+
+
+def _profile_row(user):
+    return UserProfile.objects.filter(user_id=user.pk).values_list('is_subscribed', 'subscription_end_date')
+
+
+def _end_date(row):
+    return row[1] if row and row[0] else None
+
+
+def _is_active(end_date, today):
+    today = today or timezone.now().date()
+    return end_date is not None and end_date >= today
+
+
+def membership_end_date(user):
+    """Return the subscription end date for ``user``, or None if not subscribed."""
+    cache = membership_cache()
+    key = _cache_key(user.pk)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached or None
+
+    end_date = _end_date(_profile_row(user).first())
+    cache.set(key, end_date or NO_MEMBERSHIP, _timeout(end_date))
+    return end_date
+
+
+async def amembership_end_date(user):
+    cache = membership_cache()
+    key = _cache_key(user.pk)
+    cached = await acache_call(cache, 'get', key)
+    if cached is not None:
+        return cached or None
+
+    end_date = _end_date(await _profile_row(user).afirst())
+    await acache_call(cache, 'set', key, end_date or NO_MEMBERSHIP, _timeout(end_date))
+    return end_date
+
+
+def has_active_membership(user, today=None):
+    if not user.is_authenticated:
+        return False
+    return _is_active(membership_end_date(user), today)
+
+
+async def ahas_active_membership(user, today=None):
+    if not user.is_authenticated:
+        return False
+    return _is_active(await amembership_end_date(user), today)
+
+
+def invalidate_membership(user_id):
+    membership_cache().delete(_cache_key(user_id))
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def payment_changed(sender, instance, **kwargs):
+    invalidate_membership(instance.user_id)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_membership(instance.user_id)
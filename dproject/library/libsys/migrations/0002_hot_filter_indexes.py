@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libsys', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['name'], name='libsys_author_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['status', 'id'], name='libsys_book_status_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['genre', 'status'], name='libsys_book_genre_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', 'payment_date'], name='libsys_payment_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rentbook',
+            index=models.Index(fields=['rental_end_date'], name='libsys_rent_end_date_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:14
+
+import libsys.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libsys', '0003_overdue_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refcount', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='cover_image',
+            field=models.ImageField(blank=True, null=True, storage=libsys.storage.media_storage, upload_to='book_covers/'),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='pdf',
+            field=models.FileField(blank=True, null=True, storage=libsys.storage.media_storage, upload_to='book_pdfs/'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:24
+
+import sys
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicate_book_ids(apps, schema_editor):
+    # The oldest book keeps a repeated book_id; the others become DUP-<pk> so
+    # the unique index can be built. Anything that can't be renamed aborts the
+    # migration with the full list instead of a bare IntegrityError.
+    Book = apps.get_model('libsys', 'Book')
+    books = Book.objects.using(schema_editor.connection.alias)
+    duplicated = (books.values('book_id').annotate(n=Count('id')).filter(n__gt=1)
+                  .values_list('book_id', flat=True))
+    renames = []
+    for book_id in duplicated:
+        extras = books.filter(book_id=book_id).order_by('id').values_list('id', flat=True)[1:]
+        renames.extend((pk, book_id, f'DUP-{pk}') for pk in extras)
+    if not renames:
+        return
+
+    taken = set(books.filter(book_id__in=[new for _, _, new in renames]).values_list('book_id', flat=True))
+    stuck = [(pk, old) for pk, old, new in renames if len(new) > 10 or new in taken]
+    if stuck:
+        listing = ', '.join(f'{old!r} (book {pk})' for pk, old in stuck)
+        raise RuntimeError(
+            f"Duplicate book_ids could not be renamed; fix them by hand and re-run migrate: {listing}")
+    for pk, old, new in renames:
+        books.filter(id=pk).update(book_id=new)
+    # migrate is mid-line ("Applying ...") at this point
+    sys.stderr.write(''.join(f"\n  Book {pk}: duplicate book_id {old!r} renamed to {new!r}"
+                             for pk, old, new in renames) + '\n')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libsys', '0004_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_book_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='book',
+            name='book_id',
+            field=models.CharField(max_length=10, unique=True),
+        ),
+    ]
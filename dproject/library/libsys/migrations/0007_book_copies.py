@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_copies(apps, schema_editor):
+    # Book.copies counted the copies on the shelf; give each of them a BookCopy row.
+    # Copies out on older rentals come back as new rows when those rentals are returned.
+    Book = apps.get_model('libsys', 'Book')
+    BookCopy = apps.get_model('libsys', 'BookCopy')
+    batch = []
+    for book_id, copies in Book.objects.filter(copies__gt=0).values_list('id', 'copies').iterator(chunk_size=2000):
+        batch.extend(BookCopy(book_id=book_id) for _ in range(copies))
+        if len(batch) >= 5000:
+            BookCopy.objects.bulk_create(batch)
+            batch = []
+    BookCopy.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libsys', '0006_dashboard_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rentbook',
+            name='returned_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='BookCopy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Available', 'Available'), ('Rented', 'Rented')], default='Available', max_length=20)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='copy_set', to='libsys.book')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='rentbook',
+            name='copy',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rentals', to='libsys.bookcopy'),
+        ),
+        migrations.AddIndex(
+            model_name='bookcopy',
+            index=models.Index(fields=['book', 'status'], name='libsys_copy_book_status_idx'),
+        ),
+        migrations.RunPython(create_copies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libsys', '0007_book_copies'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['is_subscribed', 'id'], name='libsys_profile_subscribed_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def fill_summaries(apps, schema_editor):
+    # One GROUP BY over the existing rentals
+    RentBook = apps.get_model('libsys', 'RentBook')
+    RentalSummary = apps.get_model('libsys', 'RentalSummary')
+    rows = RentBook.objects.order_by().values('user_id').annotate(
+        total=Count('id'), open=Count('id', filter=Q(returned_on__isnull=True)), last=Max('rental_start_date'))
+    RentalSummary.objects.bulk_create(
+        (RentalSummary(user_id=row['user_id'], total_rentals=row['total'], open_rentals=row['open'],
+                       last_rented_on=row['last']) for row in rows.iterator(chunk_size=2000)),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libsys', '0008_userprofile_subscribed_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RentalSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_rentals', models.IntegerField(default=0)),
+                ('open_rentals', models.IntegerField(default=0)),
+                ('last_rented_on', models.DateField(blank=True, null=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rental_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
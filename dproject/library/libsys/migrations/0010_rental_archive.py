@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libsys', '0009_rental_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRental',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=254)),
+                ('rental_start_date', models.DateField()),
+                ('rental_end_date', models.DateField()),
+                ('returned_on', models.DateField()),
+                ('copy_id', models.BigIntegerField(blank=True, null=True)),
+                ('archived_on', models.DateField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='rentbook',
+            index=models.Index(fields=['returned_on'], name='libsys_rent_returned_on_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedrental',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_rentals', to='libsys.book'),
+        ),
+        migrations.AddField(
+            model_name='archivedrental',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_rentals', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivedrental',
+            index=models.Index(fields=['user', '-id'], name='libsys_archive_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedrental',
+            index=models.Index(fields=['returned_on'], name='libsys_archive_returned_idx'),
+        ),
+    ]
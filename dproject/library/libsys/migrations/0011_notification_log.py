@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libsys', '0010_rental_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('due_soon', 'Rental due soon'), ('overdue', 'Rental overdue'), ('membership_expiring', 'Membership expiring')], max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('due_date', models.DateField()),
+                ('recipient', models.EmailField(max_length=254)),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['subscription_end_date'], name='libsys_profile_sub_end_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationlog',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id', 'due_date'), name='libsys_notification_once'),
+        ),
+    ]
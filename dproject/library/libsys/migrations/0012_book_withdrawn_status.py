@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libsys', '0011_notification_log'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='status',
+            field=models.CharField(choices=[('Available', 'Available'), ('Unavailable', 'Unavailable'), ('Withdrawn', 'Withdrawn')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libsys', '0012_book_withdrawn_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='rentbook',
+            name='libsys_rent_returned_on_idx',
+        ),
+        migrations.AddIndex(
+            model_name='rentbook',
+            index=models.Index(fields=['returned_on', 'rental_end_date'], name='libsys_rent_open_end_idx'),
+        ),
+    ]
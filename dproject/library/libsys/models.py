@@ -5,6 +5,7 @@ from django.utils import timezone
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
+from .storage import media_storage
 
 
 class UserProfile(models.Model):
@@ -13,6 +14,37 @@ class UserProfile(models.Model):
     subscription_start_date = models.DateField(null=True, blank=True)
     subscription_end_date = models.DateField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # The user list's subscribed/unsubscribed tabs filter on this and page by id
+            models.Index(fields=['is_subscribed', 'id'], name='libsys_profile_subscribed_idx'),
+            # send_notifications looks up memberships ending in the next few days
+            models.Index(fields=['subscription_end_date'], name='libsys_profile_sub_end_idx'),
+        ]
+
+    # Fields whose changes changed_fields() reports
+    TRACKED_FIELDS = ('is_subscribed', 'subscription_start_date', 'subscription_end_date')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded, so a save can write only what changed
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if name in cls.TRACKED_FIELDS
+        }
+        return instance
+
+    def changed_fields(self):
+        """Tracked fields assigned a new value since the profile was loaded or saved."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return list(self.TRACKED_FIELDS)
+        return [name for name, value in loaded.items() if getattr(self, name) != value]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {name: getattr(self, name) for name in self.TRACKED_FIELDS}
+
     def __str__(self):
         return self.user.username
 
@@ -29,11 +61,25 @@ def get_default_end_date():
 class Author(models.Model):
     name = models.CharField(max_length=100)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], name='libsys_author_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+class BookQuerySet(models.QuerySet):
+    # Columns the catalog and rent pages render; cover/pdf paths are left out
+    CATALOG_FIELDS = ('id', 'book_id', 'name', 'genre', 'rent', 'status', 'copies', 'author__name')
+
+    def for_catalog(self):
+        # Join the author in the same query so listing pages don't do one lookup per row
+        return self.select_related('author').only(*self.CATALOG_FIELDS)
+
+
 class Book(models.Model):
-    book_id = models.CharField(max_length=10)
+    book_id = models.CharField(max_length=10, unique=True)
     name = models.CharField(max_length=100)
     author = models.ForeignKey(Author, on_delete=models.CASCADE)
     GENRE_CHOICES = [
@@ -51,9 +97,12 @@ class Book(models.Model):
     ]
     rent = models.CharField(max_length=10, choices=RENT_CHOICES)
 
+    # Available/Unavailable follow the shelf copies (see inventory.py); Withdrawn is
+    # set by an admin and stays until an admin changes it
     STATUS_CHOICES = [
         ('Available', 'Available'),
         ('Unavailable', 'Unavailable'),
+        ('Withdrawn', 'Withdrawn'),
     ]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
 
@@ -61,12 +110,50 @@ class Book(models.Model):
     rental_days = models.IntegerField(default=7)
 
     # New fields
-    cover_image = models.ImageField(upload_to='book_covers/', null=True, blank=True)
-    pdf = models.FileField(upload_to='book_pdfs/', null=True, blank=True)
+    cover_image = models.ImageField(upload_to='book_covers/', storage=media_storage, null=True, blank=True)
+    pdf = models.FileField(upload_to='book_pdfs/', storage=media_storage, null=True, blank=True)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # rent_book filters on status and pages by id
+            models.Index(fields=['status', 'id'], name='libsys_book_status_id_idx'),
+            # books_by_genre
+            models.Index(fields=['genre', 'status'], name='libsys_book_genre_status_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+# One physical copy of a book; its id is the barcode used at check-in.
+# Book.copies/status are a cache of how many copies are Available (see inventory.py)
+class BookCopy(models.Model):
+    STATUS_CHOICES = [
+        ('Available', 'Available'),
+        ('Rented', 'Rented'),
+    ]
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='copy_set')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Available')
+
+    class Meta:
+        indexes = [
+            # Allocation looks for an Available copy of one book
+            models.Index(fields=['book', 'status'], name='libsys_copy_book_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Copy {self.pk} of {self.book_id} ({self.status})"
+
+# Stored cover/PDF file and how many Book fields point at it
+class MediaBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
 # Model for rental records
 class RentBook(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -76,11 +163,112 @@ class RentBook(models.Model):
     email = models.EmailField()
     rental_start_date = models.DateField()
     rental_end_date = models.DateField()
+    # The copy handed out; empty for rentals made before per-copy inventory
+    copy = models.ForeignKey(BookCopy, on_delete=models.SET_NULL, null=True, blank=True, related_name='rentals')
+    # Set when the book comes back; open rentals have none
+    returned_on = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Range-scanned by the overdue report
+            models.Index(fields=['rental_end_date'], name='libsys_rent_end_date_idx'),
+            # Open rentals by end date: the live overdue list and the due/overdue notices.
+            # The returned_on prefix also serves archive_rentals, which picks returned rentals by age
+            models.Index(fields=['returned_on', 'rental_end_date'], name='libsys_rent_open_end_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} rented {self.book.name}"
 
 
+# Returned rentals moved out of RentBook by the archive_rentals command (see archive.py).
+# Rows keep their RentBook id, so the two tables read as one list ordered by id.
+class ArchivedRental(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_rentals')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='archived_rentals')
+    first_name = models.CharField(max_length=100)
+    last_name = models.CharField(max_length=100)
+    email = models.EmailField()
+    rental_start_date = models.DateField()
+    rental_end_date = models.DateField()
+    returned_on = models.DateField()
+    # Plain id: copies can be retired while their history stays
+    copy_id = models.BigIntegerField(null=True, blank=True)
+    archived_on = models.DateField()
+
+    class Meta:
+        indexes = [
+            # A member's history, newest first
+            models.Index(fields=['user', '-id'], name='libsys_archive_user_id_idx'),
+            # Dropping or exporting whole periods
+            models.Index(fields=['returned_on'], name='libsys_archive_returned_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} rented {self.book_id} (archived)"
+
+
+# Per-member rental counters for the profile page, kept current on write (see history.py)
+class RentalSummary(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='rental_summary')
+    total_rentals = models.IntegerField(default=0)
+    open_rentals = models.IntegerField(default=0)
+    last_rented_on = models.DateField(null=True, blank=True)
+
+    @property
+    def returned_rentals(self):
+        return self.total_rentals - self.open_rentals
+
+    def __str__(self):
+        return f"{self.user_id}: {self.total_rentals} rentals, {self.open_rentals} open"
+
+
+# Daily precomputed overdue totals, written by the snapshot_overdue command
+class OverdueSnapshot(models.Model):
+    snapshot_date = models.DateField(unique=True)
+    overdue_rentals = models.IntegerField(default=0)
+    overdue_users = models.IntegerField(default=0)
+    overdue_books = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Overdue snapshot {self.snapshot_date}: {self.overdue_rentals} rentals"
+
+
+# Per-user or per-book line of an overdue snapshot
+class OverdueSnapshotRow(models.Model):
+    KIND_CHOICES = [
+        ('user', 'User'),
+        ('book', 'Book'),
+    ]
+
+    snapshot = models.ForeignKey(OverdueSnapshot, on_delete=models.CASCADE, related_name='rows')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, null=True, blank=True)
+    # Username or book name, copied so the report renders without joins
+    label = models.CharField(max_length=150)
+    overdue_rentals = models.IntegerField(default=0)
+    max_overdue_days = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['snapshot', 'kind', '-overdue_rentals'], name='libsys_overdue_row_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.label}: {self.overdue_rentals} overdue"
+
+
+# One running total shown on admin_dashboard (see rollups.py), e.g. "books:Comic:Available"
+class DashboardRollup(models.Model):
+    key = models.CharField(max_length=100, unique=True)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
 
 class Payment(models.Model):
     PAYMENT_METHOD_CHOICES = [
@@ -100,6 +288,12 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Membership check: payments by a user since a given date
+            models.Index(fields=['user', 'payment_date'], name='libsys_payment_user_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.payment_method} - {self.amount}"
 
@@ -125,8 +319,49 @@ class Payment(models.Model):
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
-        UserProfile.objects.create(user=instance)
+        # Cached on the user, so instance.userprofile needs no query afterwards
+        instance.userprofile = UserProfile.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.userprofile.save()
+def save_user_profile(sender, instance, created, **kwargs):
+    # Only a profile already loaded on this user can hold unsaved edits, and only
+    # the edited fields are written; most User saves (last_login on every login)
+    # don't touch the profile at all
+    if created or not User.userprofile.is_cached(instance):
+        return
+    try:
+        profile = instance.userprofile
+    except UserProfile.DoesNotExist:
+        return
+    if profile.pk is None:
+        profile.save()
+        return
+    changed = profile.changed_fields()
+    if changed:
+        profile.save(update_fields=changed)
+
+
+# One row per notification email sent, so send_notifications never sends the same one twice
+class NotificationLog(models.Model):
+    KIND_CHOICES = [
+        ('due_soon', 'Rental due soon'),
+        ('overdue', 'Rental overdue'),
+        ('membership_expiring', 'Membership expiring'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    # The RentBook or UserProfile the email was about
+    object_id = models.BigIntegerField()
+    # The rental end date or subscription end date it was about; a renewed
+    # membership has a new end date, so it gets a fresh reminder
+    due_date = models.DateField()
+    recipient = models.EmailField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id', 'due_date'], name='libsys_notification_once'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} ({self.due_date}) to {self.recipient}"
@@ -0,0 +1,90 @@
+# notifications.py
+"""Reminder emails: rentals due soon, rentals overdue and memberships about to end.
+
+Each kind of notice is a range query on an indexed date column (RentBook's
+rental_end_date, UserProfile's subscription_end_date), read in primary-key
+chunks like the exports. Messages are rendered from one compiled template per
+kind and sent in batches with send_mass_mail over a single connection that
+stays open for the whole run.
+
+NotificationLog is the idempotency ledger. A batch's ledger rows are inserted
+in the same transaction that sends it: if sending fails the rows roll back and
+the next run retries, and a rerun skips everything already recorded.
+"""
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .exports import iter_rows
+from .models import NotificationLog, RentBook, UserProfile
+
+
+def _rental_notice(queryset):
+    # (id, due date, recipient, template context) per open rental
+    columns = ('id', 'rental_end_date', 'email', 'first_name', 'book__name')
+    for rental_id, end_date, email, first_name, book_name in iter_rows(queryset, columns):
+        yield rental_id, end_date, email, {'first_name': first_name, 'book': book_name, 'due_date': end_date}
+
+
+def due_soon(today):
+    days = getattr(settings, 'NOTIFY_DUE_SOON_DAYS', 2)
+    return _rental_notice(RentBook.objects.filter(
+        returned_on__isnull=True, rental_end_date__gte=today, rental_end_date__lte=today + timedelta(days=days)))
+
+
+def overdue(today):
+    return _rental_notice(RentBook.objects.filter(returned_on__isnull=True, rental_end_date__lt=today))
+
+
+def membership_expiring(today):
+    days = getattr(settings, 'NOTIFY_MEMBERSHIP_EXPIRY_DAYS', 7)
+    profiles = UserProfile.objects.filter(
+        is_subscribed=True, subscription_end_date__gte=today, subscription_end_date__lte=today + timedelta(days=days))
+    columns = ('id', 'subscription_end_date', 'user__email', 'user__first_name')
+    for profile_id, end_date, email, first_name in iter_rows(profiles, columns):
+        yield profile_id, end_date, email, {'first_name': first_name, 'end_date': end_date}
+
+
+# kind -> (subject, notices for a date); the body is account/emails/<kind>.txt
+NOTICES = {
+    'due_soon': ("Your library book is due soon", due_soon),
+    'overdue': ("Your library book is overdue", overdue),
+    'membership_expiring': ("Your library membership is ending", membership_expiring),
+}
+
+
+def _unsent(kind, notices):
+    # One ledger lookup per batch
+    ids = [object_id for object_id, _, _, _ in notices]
+    sent = set(NotificationLog.objects.filter(kind=kind, object_id__in=ids).values_list('object_id', 'due_date'))
+    return [notice for notice in notices if notice[2] and (notice[0], notice[1]) not in sent]
+
+
+def send_notices(kind, connection, today=None, batch_size=100, dry_run=False):
+    """Send every ``kind`` notice not sent before; return how many were sent (or would be)."""
+    today = today or timezone.now().date()
+    subject, find = NOTICES[kind]
+    template = get_template(f'account/emails/{kind}.txt')
+    from_email = settings.DEFAULT_FROM_EMAIL
+    notices = find(today)
+    sent = 0
+    while batch := list(islice(notices, batch_size)):
+        batch = _unsent(kind, batch)
+        if not batch:
+            continue
+        if not dry_run:
+            messages = [(subject, template.render(context), from_email, [email])
+                        for _, _, email, context in batch]
+            with transaction.atomic():
+                NotificationLog.objects.bulk_create([
+                    NotificationLog(kind=kind, object_id=object_id, due_date=due_date, recipient=email)
+                    for object_id, due_date, email, _ in batch
+                ])
+                send_mass_mail(messages, connection=connection)
+        sent += len(batch)
+    return sent
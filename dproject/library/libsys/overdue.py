@@ -0,0 +1,68 @@
+# overdue.py
+from django.db import transaction
+from django.db.models import Count, DateField, DurationField, ExpressionWrapper, F, Min, Value
+from django.utils import timezone
+
+from .db_routing import read_replica
+from .models import OverdueSnapshot, OverdueSnapshotRow, RentBook
+
+
+def overdue_rentals(today=None):
+    """Open rentals past their end date, with ``overdue_days`` computed by the database.
+
+    ``overdue_days`` is a timedelta; user and book are joined in the same query.
+    Read from a replica when there is one.
+    """
+    today = today or timezone.now().date()
+    return (
+        RentBook.objects.using(read_replica()).filter(rental_end_date__lt=today, returned_on__isnull=True)
+        .select_related('user', 'book')
+        .annotate(overdue_days=ExpressionWrapper(
+            Value(today, output_field=DateField()) - F('rental_end_date'),
+            output_field=DurationField(),
+        ))
+    )
+
+
+def _aggregate_rows(snapshot, today, kind, group_fields):
+    # One GROUP BY query per kind, on a replica if there is one; only the grouped totals come back to Python
+    key_field, label_field = group_fields
+    grouped = (
+        RentBook.objects.using(read_replica()).filter(rental_end_date__lt=today, returned_on__isnull=True)
+        .values(key_field, label_field)
+        .annotate(rentals=Count('id'), oldest_end_date=Min('rental_end_date'))
+        .order_by()
+    )
+    return [
+        OverdueSnapshotRow(
+            snapshot=snapshot,
+            kind=kind,
+            **{f'{kind}_id': row[key_field]},
+            label=row[label_field],
+            overdue_rentals=row['rentals'],
+            max_overdue_days=(today - row['oldest_end_date']).days,
+        )
+        for row in grouped.iterator(chunk_size=2000)
+    ]
+
+
+def build_overdue_snapshot(today=None):
+    """Recompute the overdue snapshot for ``today``, replacing any earlier one."""
+    today = today or timezone.now().date()
+    with transaction.atomic():
+        OverdueSnapshot.objects.filter(snapshot_date=today).delete()
+        snapshot = OverdueSnapshot.objects.create(snapshot_date=today)
+
+        user_rows = _aggregate_rows(snapshot, today, 'user', ('user_id', 'user__username'))
+        book_rows = _aggregate_rows(snapshot, today, 'book', ('book_id', 'book__name'))
+        OverdueSnapshotRow.objects.bulk_create(user_rows + book_rows, batch_size=1000)
+
+        snapshot.overdue_rentals = sum(row.overdue_rentals for row in user_rows)
+        snapshot.overdue_users = len(user_rows)
+        snapshot.overdue_books = len(book_rows)
+        snapshot.save(update_fields=['overdue_rentals', 'overdue_users', 'overdue_books'])
+    return snapshot
+
+
+def latest_snapshot():
+    return OverdueSnapshot.objects.order_by('-snapshot_date').first()
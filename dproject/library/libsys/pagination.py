@@ -0,0 +1,118 @@
+# pagination.py
+from django.conf import settings
+
+
+# Page size used when neither the request nor settings ask for one
+DEFAULT_PAGE_SIZE = 50
+# Upper bound so a client can't ask for the whole table in one page
+MAX_PAGE_SIZE = 500
+
+
+def _parse_cursor(value):
+    # Cursors are plain primary keys; anything else is ignored
+    try:
+        cursor = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cursor if cursor > 0 else None
+
+
+def _key_of(item, key):
+    # Works for model instances and for .values() dicts
+    return item[key] if isinstance(item, dict) else getattr(item, key)
+
+
+def get_page_size(request, setting_name='CATALOG_PAGE_SIZE'):
+    default = getattr(settings, setting_name, DEFAULT_PAGE_SIZE)
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset.
+
+    ``next_cursor``/``prev_cursor`` are the ids to pass back as ``after``/``before``
+    to move forward or backward; they are None at either end of the list.
+    """
+
+    def __init__(self, items, page_size, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+
+def _seek(querysets, lookup, cursor, order, limit, key):
+    # The first ``limit`` rows past the cursor, across every queryset
+    rows = []
+    for queryset in querysets:
+        if cursor is not None:
+            queryset = queryset.filter(**{lookup: cursor})
+        rows.extend(queryset.order_by(order)[:limit])
+    if len(querysets) > 1:
+        rows.sort(key=lambda item: _key_of(item, key), reverse=order.startswith('-'))
+        del rows[limit:]
+    return rows
+
+
+def keyset_paginate(queryset, after=None, before=None, page_size=DEFAULT_PAGE_SIZE, key='id', descending=False):
+    """Return a KeysetPage of ``queryset`` ordered by ``key``.
+
+    Instead of OFFSET, each page seeks straight to ``key > after`` (or ``key < before``
+    when paging backwards) on the primary key index, so the cost of a page does not
+    grow with how deep into the list it is. One extra row is fetched to know whether
+    there is a further page. With ``descending`` the list runs from the highest key
+    down, and the comparisons flip.
+
+    ``queryset`` may also be a list of querysets whose keys don't overlap (a table and
+    its archive); they are paged as one list, at one query per queryset per page.
+    """
+    querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+    after = _parse_cursor(after)
+    before = _parse_cursor(before)
+    past, behind = ('lt', 'gt') if descending else ('gt', 'lt')
+    forward, backward = (f'-{key}', key) if descending else (key, f'-{key}')
+
+    if before is not None:
+        rows = _seek(querysets, f'{key}__{behind}', before, backward, page_size + 1, key)
+        has_more = len(rows) > page_size
+        items = rows[:page_size][::-1]
+        # The row at ``before`` comes next, so resume right after this page's last row
+        next_cursor = _key_of(items[-1], key) if items else None
+        prev_cursor = _key_of(items[0], key) if items and has_more else None
+    else:
+        rows = _seek(querysets, f'{key}__{past}', after, forward, page_size + 1, key)
+        has_more = len(rows) > page_size
+        items = rows[:page_size]
+        next_cursor = _key_of(items[-1], key) if items and has_more else None
+        prev_cursor = _key_of(items[0], key) if items and after is not None else None
+
+    return KeysetPage(items, page_size, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
+def paginate_request(request, queryset, setting_name='CATALOG_PAGE_SIZE', descending=False):
+    # Read the cursor and page size from the query string
+    return keyset_paginate(
+        queryset,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        page_size=get_page_size(request, setting_name),
+        descending=descending,
+    )
@@ -0,0 +1,77 @@
+# rentals.py
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .db_routing import stick_to_primary
+from .history import rental_closed
+from .inventory import allocate_copy, refresh_availability_on_commit, release_copy
+from .models import BookCopy, RentBook
+from .rollups import rental_returned
+
+
+def rent_book_for(user, book):
+    """Rent ``book`` to ``user``: claim one copy and record the rental in a transaction.
+
+    ``book`` only needs ``id``, ``status`` and ``rental_days`` loaded. Returns the
+    RentBook, or None if no copy was available or the title isn't Available (an
+    admin can withdraw a title that still has copies).
+    """
+    if book.status != 'Available':
+        return None
+    rental_start_date = timezone.now().date()
+    with transaction.atomic():
+        copy_id = allocate_copy(book.id)
+        if copy_id is None:
+            return None
+        # Book.copies/status (and the catalog cache) are updated once this commits
+        refresh_availability_on_commit(book.id)
+        return RentBook.objects.create(
+            user=user,
+            book=book,
+            copy_id=copy_id,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            email=user.email,
+            rental_start_date=rental_start_date,
+            rental_end_date=rental_start_date + timedelta(days=book.rental_days),
+        )
+
+
+def return_rental(rental, today=None):
+    """Close an open rental and put its copy back. Returns False if it was already returned.
+
+    ``rental`` needs ``id``, ``user_id``, ``book_id``, ``copy_id`` and ``rental_end_date`` loaded.
+    """
+    today = today or timezone.now().date()
+    with transaction.atomic():
+        # Conditional UPDATE, so a double submit can't release the copy twice
+        if not RentBook.objects.filter(id=rental.id, returned_on__isnull=True).update(returned_on=today):
+            return False
+        release_copy(rental.book_id, rental.copy_id)
+        rental_returned(rental.rental_end_date)
+        rental_closed(rental.user_id)
+        refresh_availability_on_commit(rental.book_id)
+    stick_to_primary()
+    rental.returned_on = today
+    return True
+
+
+def check_in_copy(copy_id, today=None):
+    """Check a copy in at the desk: close its open rental, if any, and make it Available.
+
+    Returns False if the copy was already on the shelf; raises BookCopy.DoesNotExist
+    for an unknown copy.
+    """
+    rental = (RentBook.objects.filter(copy_id=copy_id, returned_on__isnull=True)
+              .only('id', 'user_id', 'book_id', 'copy_id', 'rental_end_date').first())
+    if rental is not None:
+        return return_rental(rental, today)
+
+    book_id = BookCopy.objects.values_list('book_id', flat=True).get(id=copy_id)
+    with transaction.atomic():
+        if not release_copy(book_id, copy_id):
+            return False
+        refresh_availability_on_commit(book_id)
+    return True
@@ -0,0 +1,235 @@
+# rollups.py
+"""Running totals for admin_dashboard, stored in DashboardRollup.
+
+Each Book, RentBook, Payment and UserProfile row contributes to a few keyed
+totals (see CONTRIBUTIONS). A save or delete applies the difference between
+the row's old and new contributions with UPDATE ... SET value = value + delta.
+The dashboard then reads a handful of rows instead of scanning four tables.
+The UPDATE runs right after the writer commits, so a shared row such as
+"rentals:total" is locked for one statement, not for every renter's whole
+transaction. A crash in between leaves drift that reconcile_rollups repairs.
+
+Open (not returned) rentals are bucketed by end date, because "active" and
+"overdue" depend on today's date. Active rentals are the buckets from today on;
+overdue is the rest.
+
+Writes that skip signals (queryset.update(), bulk_create) have to adjust the
+totals themselves or call rebuild_rollups(). The reconcile_rollups command
+rebuilds everything from the base tables in one pass.
+"""
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Book, DashboardRollup, Payment, RentBook, UserProfile
+
+
+def _day(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def book_key(genre, status):
+    return f'books:{genre}:{status}'
+
+
+def rental_end_key(end_date):
+    return f'rentals:ends:{end_date.isoformat()}'
+
+
+def revenue_key(day):
+    return f'revenue:{day.isoformat()}'
+
+
+# model -> (fields that matter, {key: amount} for one row with those values)
+CONTRIBUTIONS = {
+    Book: (('genre', 'status'), lambda genre, status: {book_key(genre, status): 1}),
+    RentBook: (('rental_end_date', 'returned_on'), lambda end_date, returned_on: (
+        {'rentals:total': 1, rental_end_key(end_date): 1} if returned_on is None else {})),
+    Payment: (('amount', 'payment_date'), lambda amount, paid: {revenue_key(_day(paid)): amount}),
+    UserProfile: (('is_subscribed',), lambda subscribed: {'subscribers': 1} if subscribed else {}),
+}
+
+
+def _add(deltas):
+    # One UPDATE for all keys: SET value = value + CASE key WHEN ... END
+    return DashboardRollup.objects.filter(key__in=list(deltas)).update(value=F('value') + Case(
+        *[When(key=key, then=Value(delta)) for key, delta in deltas.items()],
+        default=Value(0), output_field=DashboardRollup._meta.get_field('value'),
+    ))
+
+
+def apply_deltas(deltas):
+    """Add each ``{key: delta}`` to its running total, creating missing keys."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        if _add(deltas) < len(deltas):
+            existing = set(DashboardRollup.objects.filter(key__in=list(deltas)).values_list('key', flat=True))
+            missing = {key: delta for key, delta in deltas.items() if key not in existing}
+            for key in missing:
+                DashboardRollup.objects.get_or_create(key=key)
+            _add(missing)
+
+
+def apply_deltas_on_commit(deltas):
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if deltas:
+        # The writer has committed by then: a failure is logged, and reconcile_rollups repairs it
+        transaction.on_commit(lambda: apply_deltas(deltas), robust=True)
+
+
+def _contribution(model, values):
+    if values is None:
+        return {}
+    fields, contribute = CONTRIBUTIONS[model]
+    return contribute(*(values[field] for field in fields))
+
+
+def _difference(old, new):
+    deltas = Counter()
+    for key, amount in new.items():
+        deltas[key] += amount
+    for key, amount in old.items():
+        deltas[key] -= amount
+    return deltas
+
+
+def book_status_changed(genre, old_status, new_status):
+    # For status changes made with queryset.update() (see inventory.refresh_availability)
+    apply_deltas_on_commit({book_key(genre, old_status): -1, book_key(genre, new_status): 1})
+
+
+def rental_returned(rental_end_date):
+    # For returns recorded with queryset.update() (see rentals.return_rental)
+    apply_deltas_on_commit({'rentals:total': -1, rental_end_key(rental_end_date): -1})
+
+
+def _saved_values(sender, instance):
+    fields = CONTRIBUTIONS[sender][0]
+    return {field: getattr(instance, field) for field in fields}
+
+
+@receiver(pre_save, sender=Book)
+@receiver(pre_save, sender=RentBook)
+@receiver(pre_save, sender=Payment)
+@receiver(pre_save, sender=UserProfile)
+def remember_rollup_values(sender, instance, update_fields=None, **kwargs):
+    # The values being replaced have to come from the database: one PK lookup per update
+    instance._old_rollup_values = None
+    if instance._state.adding or instance.pk is None:
+        return
+    fields = CONTRIBUTIONS[sender][0]
+    if update_fields is not None and not set(fields) & set(update_fields):
+        instance._old_rollup_values = _saved_values(sender, instance)
+        return
+    instance._old_rollup_values = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=RentBook)
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=UserProfile)
+def update_rollups(sender, instance, created, **kwargs):
+    old = None if created else getattr(instance, '_old_rollup_values', None)
+    apply_deltas_on_commit(_difference(_contribution(sender, old), _contribution(sender, _saved_values(sender, instance))))
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=RentBook)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=UserProfile)
+def remove_from_rollups(sender, instance, **kwargs):
+    apply_deltas_on_commit(_difference(_contribution(sender, _saved_values(sender, instance)), {}))
+
+
+# Rebuilding from the base tables
+
+def _book_totals():
+    rows = Book.objects.order_by().values_list('genre', 'status').annotate(n=Count('id'))
+    return {book_key(genre, status): n for genre, status, n in rows}
+
+
+def _rental_totals():
+    rows = RentBook.objects.filter(returned_on__isnull=True).order_by().values_list('rental_end_date').annotate(n=Count('id'))
+    totals = {rental_end_key(end_date): n for end_date, n in rows}
+    totals['rentals:total'] = sum(totals.values())
+    return totals
+
+
+def _revenue_totals():
+    rows = Payment.objects.order_by().annotate(day=TruncDate('payment_date')).values_list('day').annotate(
+        total=Sum('amount'))
+    return {revenue_key(day): total for day, total in rows}
+
+
+def _subscriber_totals():
+    return {'subscribers': UserProfile.objects.filter(is_subscribed=True).count()}
+
+
+SECTIONS = {
+    'books': ('books:', _book_totals),
+    'rentals': ('rentals:', _rental_totals),
+    'revenue': ('revenue:', _revenue_totals),
+    'subscribers': ('subscribers', _subscriber_totals),
+}
+
+
+def rebuild_rollups(*sections):
+    """Recompute the given sections (default: all) with one GROUP BY each."""
+    totals = {}
+    with transaction.atomic():
+        for section in sections or SECTIONS:
+            prefix, compute = SECTIONS[section]
+            DashboardRollup.objects.filter(key__startswith=prefix).delete()
+            totals.update(compute())
+        DashboardRollup.objects.bulk_create(
+            [DashboardRollup(key=key, value=value) for key, value in totals.items() if value],
+            batch_size=1000,
+        )
+    return totals
+
+
+# Reading
+
+def dashboard_totals(today=None, revenue_days=7):
+    """Everything admin_dashboard shows, read from DashboardRollup in one query."""
+    today = today or timezone.now().date()
+    first_day = today - timedelta(days=revenue_days - 1)
+    rows = dict(DashboardRollup.objects.filter(
+        Q(key__startswith='books:')
+        | Q(key__in=['rentals:total', 'subscribers'])
+        | Q(key__startswith='rentals:ends:', key__gte=rental_end_key(today))
+        | Q(key__startswith='revenue:', key__gte=revenue_key(first_day))
+    ).values_list('key', 'value'))
+
+    genres = {}
+    statuses = Counter()
+    for key, value in rows.items():
+        # Keys that dropped to zero stay in the table until the next rebuild
+        if key.startswith('books:') and value:
+            _, genre, status = key.split(':', 2)
+            genres.setdefault(genre, Counter())[status] += int(value)
+            statuses[status] += int(value)
+
+    total_rentals = int(rows.get('rentals:total', 0))
+    active_rentals = sum(int(value) for key, value in rows.items() if key.startswith('rentals:ends:'))
+    revenue = [(first_day + timedelta(days=i), rows.get(revenue_key(first_day + timedelta(days=i)), Decimal('0')))
+               for i in range(revenue_days)]
+    return {
+        'books_by_genre': [(genre, dict(counts), sum(counts.values())) for genre, counts in sorted(genres.items())],
+        'books_by_status': dict(statuses),
+        'books_total': sum(statuses.values()),
+        'active_rentals': active_rentals,
+        'overdue_rentals': total_rentals - active_rentals,
+        'subscribers': int(rows.get('subscribers', 0)),
+        'revenue': revenue,
+        'revenue_total': sum(amount for _, amount in revenue),
+    }
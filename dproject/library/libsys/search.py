@@ -0,0 +1,302 @@
+# search.py
+"""In-memory trigram index over author names and book titles.
+
+The index is built lazily from the database the first time it is queried and
+then kept current by the post_save/post_delete receivers at the bottom of this
+module (connected in LibsysConfig.ready). Each worker process holds its own
+copy, so it is also rebuilt after SEARCH_INDEX_MAX_AGE seconds to pick up
+edits made by other processes.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Author, Book
+
+
+# Results returned when the caller doesn't ask for a number
+DEFAULT_LIMIT = 10
+# Hard cap on results per query
+MAX_LIMIT = 50
+# Fraction of query trigrams a fuzzy match has to contain
+MIN_COVERAGE = 0.5
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(text):
+    return _WHITESPACE.sub(' ', str(text or '')).strip().casefold()
+
+
+def trigrams(text, pad_end=True):
+    # Pad like pg_trgm so word starts get their own trigrams ("  t", " to", ...).
+    # Queries are padded at the front only, so "tol" still matches "tolkien".
+    grams = set()
+    for word in text.split(' '):
+        if not word:
+            continue
+        padded = f'  {word} ' if pad_end else f'  {word}'
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Prefix and trigram lookups for one kind of document (authors or books).
+
+    Prefix matches come from two sorted lists searched with bisect, so typical
+    autocomplete queries never touch the trigram postings. Those are only used
+    for substring and fuzzy matches when the prefix passes come up short.
+    """
+
+    def __init__(self):
+        self.docs = {}       # key -> (normalized text, payload dict)
+        self.texts = []      # sorted (text, key)
+        self.words = []      # sorted (word, key) for every word of every text
+        self.postings = {}   # trigram -> set of keys
+
+    def __len__(self):
+        return len(self.docs)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build an index from (key, text, payload) rows, sorting once at the end."""
+        index = cls()
+        for key, text, payload in rows:
+            text = normalize(text)
+            index.docs[key] = (text, payload)
+            index.texts.append((text, key))
+            index.words.extend((word, key) for word in set(text.split(' ')))
+            for gram in trigrams(text):
+                index.postings.setdefault(gram, set()).add(key)
+        index.texts.sort()
+        index.words.sort()
+        return index
+
+    def add(self, key, text, payload):
+        self.remove(key)
+        text = normalize(text)
+        self.docs[key] = (text, payload)
+        bisect.insort(self.texts, (text, key))
+        for word in set(text.split(' ')):
+            bisect.insort(self.words, (word, key))
+        for gram in trigrams(text):
+            self.postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key):
+        entry = self.docs.pop(key, None)
+        if entry is None:
+            return
+        text = entry[0]
+        _discard_sorted(self.texts, (text, key))
+        for word in set(text.split(' ')):
+            _discard_sorted(self.words, (word, key))
+        for gram in trigrams(text):
+            keys = self.postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[gram]
+
+    def _prefix_matches(self, entries, query, found, limit, tier):
+        # Walk the sorted entries starting with ``query`` until the page is full
+        i = bisect.bisect_left(entries, (query,))
+        while i < len(entries) and len(found) < limit:
+            value, key = entries[i]
+            if not value.startswith(query):
+                break
+            if key not in found:
+                found[key] = tier + 1 if value == query and tier == 3 else tier
+            i += 1
+
+    def _trigram_matches(self, query, found, limit):
+        grams = trigrams(query, pad_end=False)
+        postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        # Documents containing every query trigram, intersecting from the rarest;
+        # if there aren't enough of those, fall back to partial overlap
+        candidates = set(postings[0]) if postings else set()
+        for keys in postings[1:]:
+            if not candidates:
+                break
+            candidates &= keys
+        coverage = dict.fromkeys(candidates, 1.0)
+        if len(candidates) + len(found) < limit:
+            counts = Counter()
+            for keys in postings:
+                counts.update(keys)
+            needed = len(grams) * MIN_COVERAGE
+            coverage = {key: hits / len(grams) for key, hits in counts.items() if hits >= needed}
+
+        def rank(key):
+            text = self.docs[key][0]
+            return (1 if query in text else 0) + coverage[key], -len(text)
+
+        remaining = [key for key in coverage if key not in found]
+        for key in heapq.nlargest(limit - len(found), remaining, key=rank):
+            found[key] = rank(key)[0]
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Return up to ``limit`` payloads ranked by match quality.
+
+        Scores: 4 exact, 3 text starts with the query, 2 a word starts with it,
+        1-2 substring (plus trigram coverage), below 1 fuzzy trigram overlap.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        found = {}
+        self._prefix_matches(self.texts, query, found, limit, tier=3)
+        if len(found) < limit and ' ' not in query:
+            self._prefix_matches(self.words, query, found, limit, tier=2)
+        if len(found) < limit:
+            self._trigram_matches(query, found, limit)
+
+        ranked = sorted(found.items(), key=lambda item: item[1], reverse=True)
+        return [dict(self.docs[key][1], score=round(score, 3)) for key, score in ranked]
+
+
+def _discard_sorted(entries, entry):
+    i = bisect.bisect_left(entries, entry)
+    if i < len(entries) and entries[i] == entry:
+        del entries[i]
+
+
+class CatalogSearch:
+    """Author and book indexes, built on first use and updated from signals."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Held while building, so concurrent first requests build the index once
+        self._build_lock = threading.Lock()
+        self.authors = None
+        self.books = None
+        self.built_at = None
+
+    @property
+    def is_built(self):
+        return self.authors is not None
+
+    def _expired(self):
+        max_age = getattr(settings, 'SEARCH_INDEX_MAX_AGE', 300)
+        return max_age is not None and time.monotonic() - self.built_at > max_age
+
+    def build(self):
+        authors = TrigramIndex.from_rows(
+            (pk, name, {'id': pk, 'name': name})
+            for pk, name in Author.objects.values_list('id', 'name').iterator(chunk_size=2000)
+        )
+        books = TrigramIndex.from_rows(
+            (pk, f'{name} {book_id}', {'id': pk, 'book_id': book_id, 'name': name})
+            for pk, book_id, name in Book.objects.values_list('id', 'book_id', 'name').iterator(chunk_size=2000)
+        )
+
+        with self._lock:
+            self.authors, self.books = authors, books
+            self.built_at = time.monotonic()
+
+    def _is_current(self):
+        return self.is_built and not self._expired()
+
+    def _ensure_built(self):
+        if self._is_current():
+            return
+        if self.is_built:
+            # Expired: one caller rebuilds while the others keep using the current index
+            if self._build_lock.acquire(blocking=False):
+                try:
+                    self.build()
+                finally:
+                    self._build_lock.release()
+            return
+        with self._build_lock:
+            if not self.is_built:
+                self.build()
+
+    async def _aensure_built(self):
+        # Only the (rare) build touches the database; searching is in-memory
+        if not self._is_current():
+            await sync_to_async(self._ensure_built)()
+
+    def reset(self):
+        with self._lock:
+            self.authors = self.books = self.built_at = None
+
+    def search_authors(self, query, limit=DEFAULT_LIMIT):
+        self._ensure_built()
+        with self._lock:
+            return self.authors.search(query, clamp_limit(limit))
+
+    def search_books(self, query, limit=DEFAULT_LIMIT):
+        self._ensure_built()
+        with self._lock:
+            return self.books.search(query, clamp_limit(limit))
+
+    async def asearch_authors(self, query, limit=DEFAULT_LIMIT):
+        await self._aensure_built()
+        with self._lock:
+            return self.authors.search(query, clamp_limit(limit))
+
+    async def asearch_books(self, query, limit=DEFAULT_LIMIT):
+        await self._aensure_built()
+        with self._lock:
+            return self.books.search(query, clamp_limit(limit))
+
+    def update_author(self, author):
+        with self._lock:
+            if self.is_built:
+                self.authors.add(author.pk, author.name, {'id': author.pk, 'name': author.name})
+
+    def remove_author(self, author):
+        with self._lock:
+            if self.is_built:
+                self.authors.remove(author.pk)
+
+    def update_book(self, book):
+        with self._lock:
+            if self.is_built:
+                self.books.add(book.pk, f'{book.name} {book.book_id}',
+                               {'id': book.pk, 'book_id': book.book_id, 'name': book.name})
+
+    def remove_book(self, book):
+        with self._lock:
+            if self.is_built:
+                self.books.remove(book.pk)
+
+
+def clamp_limit(limit):
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        limit = DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
+
+# Process-wide index used by the views
+catalog_search = CatalogSearch()
+
+
+@receiver(post_save, sender=Author)
+def index_author(sender, instance, **kwargs):
+    catalog_search.update_author(instance)
+
+
+@receiver(post_delete, sender=Author)
+def unindex_author(sender, instance, **kwargs):
+    catalog_search.remove_author(instance)
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, **kwargs):
+    catalog_search.update_book(instance)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    catalog_search.remove_book(instance)
@@ -0,0 +1,137 @@
+# storage.py
+"""Content-addressed storage for book covers and PDFs.
+
+Files are named by the SHA-256 of their bytes inside the field's upload_to
+directory (``book_covers/ab/ab12...ef.jpg``), so uploading the same cover or
+PDF again reuses the stored blob instead of writing a suffixed copy. Which
+blobs are in use is tracked in MediaBlob.refcount by the Book signals below;
+the dedupe_media command migrates old files and removes unreferenced blobs.
+"""
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils.deconstruct import deconstructible
+
+
+MEDIA_FIELDS = ('cover_image', 'pdf')
+
+
+def content_hash(content):
+    """SHA-256 of a Django File, leaving it rewound for the actual write."""
+    hasher = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+def blob_name(directory, digest, original_name):
+    ext = os.path.splitext(original_name)[1].lower()
+    return posixpath.join(directory, digest[:2], f'{digest}{ext}')
+
+
+def is_blob_name(name):
+    # <upload_to>/<2 hex>/<64 hex><ext>
+    parts = name.split('/')
+    if len(parts) < 3:
+        return False
+    digest = os.path.splitext(parts[-1])[0]
+    return len(digest) == 64 and parts[-2] == digest[:2] and all(c in '0123456789abcdef' for c in digest)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that stores each distinct file once, named by its hash."""
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is decided in _save; equal names mean equal content
+        return name
+
+    def _save(self, name, content):
+        name = blob_name(posixpath.dirname(name), content_hash(content), name)
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Write to a temp file and rename, so a concurrent upload of the same
+        # bytes can never leave a half-written blob behind the final name
+        temp_path = f'{full_path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+
+def media_storage():
+    # Callable so migrations don't freeze MEDIA_ROOT into the field definition
+    return _media_storage
+
+
+_media_storage = ContentAddressedStorage()
+
+
+# Reference counting across Book.cover_image / Book.pdf
+
+def _adjust(name, delta):
+    from .models import MediaBlob
+
+    if not name:
+        return
+    if delta > 0:
+        MediaBlob.objects.get_or_create(name=name)
+    MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + delta)
+
+
+def _stored_names(instance):
+    return {field: getattr(instance, field).name or '' for field in MEDIA_FIELDS
+            if field in instance.__dict__}
+
+
+@receiver(pre_save, sender='libsys.Book')
+def remember_media(sender, instance, using, update_fields=None, **kwargs):
+    # The names being replaced have to come from the database being written
+    # (not a replica): one PK lookup per save that writes a file field
+    instance._old_media = {}
+    if instance.pk is None:
+        return
+    fields = [f for f in MEDIA_FIELDS if update_fields is None or f in update_fields]
+    if fields:
+        row = sender.objects.using(using).filter(pk=instance.pk).values(*fields).first()
+        instance._old_media = row or {}
+
+
+@receiver(post_save, sender='libsys.Book')
+def count_media(sender, instance, created, update_fields=None, **kwargs):
+    old = getattr(instance, '_old_media', {})
+    new = _stored_names(instance)
+    with transaction.atomic():
+        for field, name in new.items():
+            if update_fields is not None and field not in update_fields:
+                # Not written by this save, so its reference didn't change
+                continue
+            before = old.get(field) or ''
+            if name != before:
+                _adjust(name, +1)
+                _adjust(before, -1)
+
+
+@receiver(post_delete, sender='libsys.Book')
+def release_media(sender, instance, **kwargs):
+    for name in _stored_names(instance).values():
+        _adjust(name, -1)
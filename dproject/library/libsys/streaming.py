@@ -0,0 +1,138 @@
+# streaming.py
+"""Chunked file responses with byte ranges, strong ETags and conditional GETs."""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_etag(stat):
+    """Strong ETag from size and nanosecond mtime.
+
+    Any rewrite of the file changes one of them, so the tag identifies the exact
+    bytes without reading the file (hashing a large PDF would delay its first page).
+    """
+    return quote_etag(f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+
+
+def parse_range(header, size):
+    """Return (start, end) inclusive for a single "bytes=" range.
+
+    Returns None when there is no usable range (serve the whole file) and
+    raises ValueError when the range can't be satisfied (416).
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match:
+        # Multiple ranges or another unit: a full 200 response is always allowed
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _read_range(path, start, length, chunk_size=CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        # If-None-Match wins over If-Modified-Since when both are sent
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags or f'W/{etag}' in tags
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(mtime) <= since
+
+
+def _range_still_valid(request, etag, mtime):
+    # If-Range: only honour Range when the client's copy is still current
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def serve_file(request, path, download_name, storage_name=None, content_type=None):
+    """Serve ``path`` with Range, ETag and If-Modified-Since support.
+
+    With settings.PDF_DELIVERY_MODE set to 'x-accel' or 'x-sendfile' the body is
+    handed off to the front-end server instead (it handles ranges itself);
+    ``storage_name`` is the file's name relative to MEDIA_ROOT for X-Accel.
+    """
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    content_type = content_type or mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'private, max-age=0, must-revalidate',
+        'Content-Disposition': f'inline; filename="{download_name}"',
+    }
+    if _not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        for name in ('ETag', 'Last-Modified', 'Cache-Control'):
+            response[name] = headers[name]
+        return response
+
+    mode = getattr(settings, 'PDF_DELIVERY_MODE', 'stream')
+    if mode in ('x-accel', 'x-sendfile'):
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if mode == 'x-accel':
+            prefix = getattr(settings, 'PDF_ACCEL_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix + (storage_name or os.path.basename(path))
+        else:
+            response['X-Sendfile'] = path
+        return response
+
+    size = stat.st_size
+    byte_range = None
+    if _range_still_valid(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            return HttpResponse(status=416, headers={'Content-Range': f'bytes */{size}'})
+
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    length = end - start + 1 if size else 0
+
+    response = StreamingHttpResponse(
+        _read_range(path, start, length), status=status, content_type=content_type, headers=headers)
+    response['Content-Length'] = str(length)
+    return response
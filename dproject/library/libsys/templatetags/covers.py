@@ -0,0 +1,31 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from ..thumbnails import cover_sources, thumbnail_sizes
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def cover_picture(field_file, size='small', alt='', css_class=''):
+    """Render a <picture> with AVIF/WebP/JPEG thumbnail srcsets for a cover image.
+
+    Usage: {% cover_picture book.cover_image 'small' alt=book.name css_class='book-cover-image' %}
+    Falls back to the original image if thumbnails can't be produced.
+    """
+    if not field_file:
+        return ''
+    width, height = thumbnail_sizes()[size]
+    sources = cover_sources(field_file, size)
+    if not sources:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', field_file.url, alt, css_class)
+
+    # The last source is JPEG, which doubles as the <img> fallback
+    *modern, (_jpeg_type, jpeg_srcset) = sources
+    fallback = jpeg_srcset.split(' ', 1)[0]
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" width="{}" height="{}" alt="{}" class="{}" loading="lazy"></picture>',
+        format_html_join('', '<source type="{}" srcset="{}">', modern),
+        fallback, jpeg_srcset, width, height, alt, css_class,
+    )
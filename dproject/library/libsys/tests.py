@@ -1,3 +1,1237 @@
-from django.test import TestCase
+import gzip
+import importlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from .models import (
+    ArchivedRental, Author, Book, BookCopy, MediaBlob, NotificationLog, OverdueSnapshot, Payment, RentalSummary,
+    RentBook, UserProfile,
+)
+from .catalog_cache import FRESH_KEY, bump_catalog_version, cached_catalog, catalog_version
+from .db_routing import STICKY_COOKIE, read_replica, read_routing
+from .inventory import refresh_availability, sync_copies
+from .instrumentation import fingerprint, sql_stats
+from .membership import ahas_active_membership, has_active_membership, membership_cache
+from .overdue import build_overdue_snapshot, overdue_rentals
+from .pagination import keyset_paginate
+from .rentals import check_in_copy, rent_book_for, return_rental
+from .rollups import dashboard_totals
+from .search import catalog_search
+from .thumbnails import ensure_thumbnails
+
+
+def make_books(count, author=None, **fields):
+    author = author or Author.objects.create(name='Test Author')
+    books = [
+        Book(book_id=f'B{i}', name=f'Book {i}', author=author, genre='Comic', rent='100',
+             status='Available', copies=1, **fields)
+        for i in range(count)
+    ]
+    books = Book.objects.bulk_create(books)
+    # bulk_create sends no post_save, so put the copies on the shelf here
+    sync_copies([book.id for book in books])
+    return books
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.books = make_books(25)
+        self.ids = [book.id for book in self.books]
+
+    def test_walks_forward_and_back(self):
+        queryset = Book.objects.for_catalog()
+        first = keyset_paginate(queryset, page_size=10)
+        self.assertEqual([b.id for b in first], self.ids[:10])
+        self.assertFalse(first.has_previous)
+
+        second = keyset_paginate(queryset, after=first.next_cursor, page_size=10)
+        self.assertEqual([b.id for b in second], self.ids[10:20])
+
+        last = keyset_paginate(queryset, after=second.next_cursor, page_size=10)
+        self.assertEqual([b.id for b in last], self.ids[20:])
+        self.assertFalse(last.has_next)
+
+        back = keyset_paginate(queryset, before=last.prev_cursor, page_size=10)
+        self.assertEqual([b.id for b in back], self.ids[10:20])
+        self.assertTrue(back.has_previous)
+
+        # And forward again to the same last page, no row skipped
+        again = keyset_paginate(queryset, after=back.next_cursor, page_size=10)
+        self.assertEqual([b.id for b in again], [b.id for b in last])
+
+    def test_catalog_page_does_not_query_per_row(self):
+        caches['catalog'].clear()
+        # Session/auth aside, the page is a single books query with authors joined
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('books_catalog'), {'page_size': 20})
+        self.assertEqual(len(response.context['books']), 20)
+        self.assertContains(response, 'Test Author')
+
+
+def is_full_scan(plan, table):
+    """Return True if an EXPLAIN ``plan`` reads every row of ``table``."""
+    if connection.vendor != 'mysql':
+        plan = plan.lower()
+    if connection.vendor == 'sqlite':
+        # "SCAN libsys_book" with no index; a covering index scan is fine
+        return any(
+            re.search(rf'\bscan {table}\b', line) and 'index' not in line
+            for line in plan.splitlines()
+        )
+    if connection.vendor == 'postgresql':
+        return f'seq scan on {table}' in plan
+    if connection.vendor == 'mysql':
+        # EXPLAIN FORMAT=JSON: access type ALL on the table means a full table scan
+        return any(step.get('table_name') == table and step.get('access_type') == 'ALL'
+                   for step in _mysql_plan_tables(json.loads(plan)))
+    return False
+
+
+def _mysql_plan_tables(node):
+    # Every "table" entry of a MySQL JSON plan, however deeply nested
+    if isinstance(node, dict):
+        if 'table_name' in node:
+            yield node
+        for value in node.values():
+            yield from _mysql_plan_tables(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _mysql_plan_tables(value)
+
+
+class HotQueryPlanTests(TestCase):
+    """Fail if any of the hot filters stop being answered from an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Seed Author')
+        Author.objects.bulk_create(Author(name=f'Author {i}') for i in range(200))
+        make_books(200, author=author)
+        Book.objects.filter(id__in=Book.objects.values('id')[:50]).update(status='Unavailable', genre='Horror')
+        cls.user = User.objects.create_user(username='planner1', password='pw12345678')
+        today = timezone.now().date()
+        books = list(Book.objects.all()[:100])
+        RentBook.objects.bulk_create(
+            RentBook(user=cls.user, book=book, first_name='a', last_name='b', email='a@b.com',
+                     rental_start_date=today - timedelta(days=i + 7),
+                     rental_end_date=today - timedelta(days=i))
+            for i, book in enumerate(books)
+        )
+        Payment.objects.bulk_create(
+            Payment(user=cls.user, payment_method='upi', upi_id='x@upi', amount=750) for _ in range(50)
+        )
+
+    def assertUsesIndex(self, queryset, table):
+        plan = queryset.explain(format='json') if connection.vendor == 'mysql' else queryset.explain()
+        self.assertFalse(is_full_scan(plan, table), f'Full scan of {table}:\n{plan}')
+
+    def test_overdue_range_scan(self):
+        today = timezone.now().date()
+        self.assertUsesIndex(RentBook.objects.filter(rental_end_date__lt=today), 'libsys_rentbook')
+
+    def test_live_overdue_page(self):
+        # The page query behind overdue_books_view, cursor and limit included
+        page = overdue_rentals().filter(id__gt=0).order_by('id')[:51]
+        self.assertUsesIndex(page, 'libsys_rentbook')
+
+    def test_available_books(self):
+        self.assertUsesIndex(Book.objects.filter(status='Available').order_by('id'), 'libsys_book')
+
+    def test_books_by_genre(self):
+        self.assertUsesIndex(Book.objects.filter(genre='Horror'), 'libsys_book')
+
+    def test_membership_payment_probe(self):
+        since = timezone.now() - timedelta(days=365)
+        self.assertUsesIndex(Payment.objects.filter(user=self.user, payment_date__gte=since), 'libsys_payment')
+
+    def test_author_name_lookup(self):
+        # icontains can't use a b-tree index; exact/ordered name lookups can
+        self.assertUsesIndex(Author.objects.filter(name='Seed Author'), 'libsys_author')
+
+
+class CatalogSearchTests(TestCase):
+    def setUp(self):
+        catalog_search.reset()
+        self.addCleanup(catalog_search.reset)
+        for name in ['J.R.R. Tolkien', 'Leo Tolstoy', 'Christopher Tolkien', 'Agatha Christie']:
+            Author.objects.create(name=name)
+
+    def test_prefix_matches_rank_first(self):
+        names = [r['name'] for r in catalog_search.search_authors('tolk')]
+        # Fuzzy matches like "Tolstoy" may follow, but only after the real ones
+        self.assertEqual(set(names[:2]), {'J.R.R. Tolkien', 'Christopher Tolkien'})
+
+        names = [r['name'] for r in catalog_search.search_authors('chris')]
+        # Name starting with the query beats a later word that starts with it
+        self.assertEqual(names[:2], ['Christopher Tolkien', 'Agatha Christie'])
+
+    def test_index_follows_signals(self):
+        self.assertEqual(catalog_search.search_authors('austen'), [])
+        author = Author.objects.create(name='Jane Austen')
+        self.assertEqual(catalog_search.search_authors('austen')[0]['name'], 'Jane Austen')
+        author.delete()
+        self.assertEqual(catalog_search.search_authors('austen'), [])
+
+    def test_book_search_by_title_and_id(self):
+        author = Author.objects.first()
+        Book.objects.create(book_id='HB101', name='The Hobbit', author=author, genre='Comic',
+                            rent='100', status='Available')
+        self.assertEqual(catalog_search.search_books('hobb')[0]['book_id'], 'HB101')
+        self.assertEqual(catalog_search.search_books('hb10')[0]['name'], 'The Hobbit')
+
+    def test_results_are_capped(self):
+        Author.objects.bulk_create(Author(name=f'Tolkien {i}') for i in range(80))
+        catalog_search.reset()
+        response = self.client.get(reverse('search_authors'), {'query': 'tolkien', 'limit': 500})
+        self.assertEqual(len(response.json()), 50)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.author = Author.objects.create(name='Cached Author')
+        self.book = Book.objects.create(book_id='C1', name='Cached Book', author=self.author,
+                                        genre='Horror', rent='100', status='Available')
+
+    def test_genre_page_served_from_cache_until_catalog_changes(self):
+        url = reverse('books_by_genre', args=['Horror'])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(url), 'Cached Book')
+
+        version = catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.name = 'Renamed Book'
+            self.book.save()
+        self.assertEqual(catalog_version(), version + 1)
+        self.assertContains(self.client.get(url), 'Renamed Book')
+
+    def test_rental_bumps_version(self):
+        version = catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            rent_book_for(User.objects.create(username='reader1'), self.book)
+        self.assertEqual(catalog_version(), version + 1)
+
+
+class BookPdfTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root, PDF_DELIVERY_MODE='stream')
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.content = bytes(range(256)) * 1024
+        self.book = make_books(1)[0]
+        self.book.pdf.save('sample.pdf', ContentFile(self.content))
+        self.user = User.objects.create(username='reader1')
+        self.client.force_login(self.user)
+        self.url = reverse('book_pdf', args=[self.book.id])
+        today = timezone.now().date()
+        RentBook.objects.create(user=self.user, book=self.book, first_name='a', last_name='b', email='a@b.com',
+                                rental_start_date=today, rental_end_date=today + timedelta(days=7))
+
+    def test_full_download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=100-199'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=-10'})
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+
+        response = self.client.get(self.url, headers={'Range': f'bytes={len(self.content)}-'})
+        self.assertEqual(response.status_code, 416)
+
+    def test_conditional_get(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        # A stale If-Range falls back to the full file
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_requires_an_active_rental(self):
+        self.client.force_login(User.objects.create(username='stranger1'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @override_settings(PDF_DELIVERY_MODE='x-accel', PDF_ACCEL_PREFIX='/protected-media/')
+    def test_accel_redirect_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.book.pdf.name}')
+        self.assertEqual(response.content, b'')
+
+
+class CoverThumbnailTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+
+        buffer = BytesIO()
+        Image.new('RGB', (800, 1200), (200, 30, 30)).save(buffer, 'JPEG', quality=95)
+        self.book = make_books(1)[0]
+        self.book.cover_image.save('cover.jpg', ContentFile(buffer.getvalue()))
+
+    def test_picture_tag_emits_small_srcsets(self):
+        html = Template("{% load covers %}{% cover_picture book.cover_image 'small' alt='x' %}").render(
+            Context({'book': self.book}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('-100x150.jpg 1x', html)
+        self.assertIn('-200x300.jpg 2x', html)
+
+        variants = ensure_thumbnails(self.book.cover_image, ['small'])['small']
+        storage = self.book.cover_image.storage
+        self.assertLess(storage.size(variants['jpg'][1]), storage.size(self.book.cover_image.name))
+
+
+class ContentAddressedMediaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_identical_uploads_share_one_blob(self):
+        first, second = make_books(2)
+        first.pdf.save('a.pdf', ContentFile(b'%PDF same bytes'))
+        second.pdf.save('b.pdf', ContentFile(b'%PDF same bytes'))
+        self.assertEqual(first.pdf.name, second.pdf.name)
+        self.assertEqual(MediaBlob.objects.get(name=first.pdf.name).refcount, 2)
+
+        first.delete()
+        self.assertEqual(MediaBlob.objects.get(name=second.pdf.name).refcount, 1)
+
+    def test_saves_that_keep_the_file_keep_the_count(self):
+        book = make_books(1)[0]
+        book.cover_image.save('c.jpg', ContentFile(b'cover bytes'))
+        name = book.cover_image.name
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+        book.name = 'Renamed'
+        book.save(update_fields=['name'])
+        book.save()
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+        book.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 0)
+
+    def test_command_merges_legacy_duplicates_and_collects_garbage(self):
+        for name in ['book_covers/one.jpg', 'book_covers/one_AbC123.jpg', 'book_covers/orphan.jpg']:
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'orphan' if 'orphan' in name else b'duplicate cover')
+        first, second = make_books(2)
+        Book.objects.filter(id=first.id).update(cover_image='book_covers/one.jpg')
+        Book.objects.filter(id=second.id).update(cover_image='book_covers/one_AbC123.jpg')
+
+        call_command('dedupe_media', '--gc', '--grace-minutes=0', stdout=StringIO())
+
+        names = set(Book.objects.values_list('cover_image', flat=True))
+        self.assertEqual(len(names), 1)
+        stored = [f for _, _, files in os.walk(os.path.join(self.media_root, 'book_covers')) for f in files]
+        self.assertEqual(len(stored), 1)
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+
+
+class ImportBooksTests(TestCase):
+    def test_imports_and_upserts_on_book_id(self):
+        Author.objects.create(name='Existing Author')
+        make_books(1)  # book_id B0
+        feed = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        self.addCleanup(os.remove, feed.name)
+        with feed:
+            feed.write('book_id,name,author,genre,rent,status,copies,rental_days\n')
+            feed.write('B0,Updated Title,Existing Author,Horror,200,Available,3,14\n')
+            for i in range(1, 6):
+                feed.write(f'N{i},New {i},Author {i % 2},Comic,100,Available,1,7\n')
+            feed.write('BAD,No Genre,Someone,Poetry,100,Available,1,7\n')
+            feed.write('NEG,Negative,Someone,Comic,100,Available,-1,7\n')
+            feed.write(f'LONG,{"x" * 101},Someone,Comic,100,Available,1,7\n')
+            feed.write('B_TOO_LONG_ID,Long Id,Someone,Comic,100,Available,1,7\n')
+
+        errors = StringIO()
+        call_command('import_books', feed.name, '--batch-size=2', stdout=StringIO(), stderr=errors)
+
+        updated = Book.objects.select_related('author').get(book_id='B0')
+        self.assertEqual((updated.name, updated.author.name, updated.copies), ('Updated Title', 'Existing Author', 3))
+        self.assertEqual(Book.objects.filter(book_id__startswith='N').count(), 5)
+        self.assertFalse(Book.objects.filter(book_id__in=['BAD', 'NEG', 'LONG', 'B_TOO_LONG']).exists())
+        self.assertEqual(len(errors.getvalue().splitlines()), 4)
+        self.assertEqual(Author.objects.filter(name__in=['Author 0', 'Author 1']).count(), 2)
+
+    def test_jsonl_input(self):
+        feed = tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False)
+        self.addCleanup(os.remove, feed.name)
+        with feed:
+            feed.write('{"book_id": "J1", "name": "Json Book", "author": "Jay", "genre": "Research", '
+                       '"rent": "300", "status": "Available"}\n')
+            feed.write('not json\n')
+        call_command('import_books', feed.name, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Book.objects.get(book_id='J1').author.name, 'Jay')
+
+    def test_upsert_without_conflict_target(self):
+        # MySQL's ON DUPLICATE KEY UPDATE can't name the conflicting column
+        feed = tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False)
+        self.addCleanup(os.remove, feed.name)
+        with feed:
+            feed.write('{"book_id": "M1", "name": "Book", "author": "Ann", "genre": "Comic", '
+                       '"rent": "100", "status": "Available"}\n')
+        features = connection.features
+        with mock.patch.object(features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(Book.objects, 'bulk_create', return_value=[]) as bulk_create:
+            call_command('import_books', feed.name, stdout=StringIO(), stderr=StringIO())
+        _, options = bulk_create.call_args
+        self.assertNotIn('unique_fields', options)
+        self.assertTrue(options['update_conflicts'])
+
+
+class ImportMembersTests(TestCase):
+    def test_imports_members_with_profiles(self):
+        User.objects.create_user(username='taken1', password='old-password1')
+        feed = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        self.addCleanup(os.remove, feed.name)
+        with feed:
+            feed.write('username,email,first_name,last_name,password,subscription_start_date,subscription_end_date\n')
+            feed.write('pupil1,p1@school.test,Pat,One,secret-pw1,,\n')
+            feed.write('pupil2,p2@school.test,Pam,Two,secret-pw2,2026-01-01,2026-12-31\n')
+            feed.write('taken1,,,,new-password1,,\n')
+            feed.write('pupil1,dup@school.test,,,other-pw1,,\n')
+            feed.write(',nobody@school.test,,,pw,,\n')
+
+        out = StringIO()
+        call_command('import_members', feed.name, '--workers=2', '--batch-size=2', '--subscription-days=30',
+                     stdout=out, stderr=StringIO())
+        self.assertIn('Imported 2 members (1 already existed, 2 skipped)', out.getvalue())
+
+        pupil1 = User.objects.select_related('userprofile').get(username='pupil1')
+        self.assertTrue(pupil1.check_password('secret-pw1'))
+        self.assertEqual(pupil1.email, 'p1@school.test')
+        today = timezone.now().date()
+        self.assertEqual(pupil1.userprofile.subscription_end_date, today + timedelta(days=30))
+        pupil2 = UserProfile.objects.get(user__username='pupil2')
+        self.assertEqual(pupil2.subscription_end_date.isoformat(), '2026-12-31')
+        self.assertTrue(User.objects.get(username='taken1').check_password('old-password1'))
+        self.assertEqual(dashboard_totals()['subscribers'], 2)
+
+
+class CatalogApiTests(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.books = make_books(5)
+
+    def test_cursor_pagination_and_field_selection(self):
+        url = reverse('api_books')
+        first = self.client.get(url, {'page_size': 3, 'fields': 'name,author'}).json()
+        self.assertEqual(first['results'][0], {'id': self.books[0].id, 'name': 'Book 0', 'author': 'Test Author'})
+        second = self.client.get(first['next']).json()
+        self.assertEqual([b['name'] for b in second['results']], ['Book 3', 'Book 4'])
+        self.assertIsNone(second['next'])
+
+        self.assertEqual(self.client.get(url, {'fields': 'pdf'}).status_code, 400)
+
+    def test_bad_filter_values(self):
+        url = reverse('api_books')
+        for query in ({'author_id': 'abc'}, {'status': 'Lost'}, {'genre': 'Fiction'}):
+            response = self.client.get(url, query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn('error', response.json())
+        author_id = self.books[0].author_id
+        self.assertEqual(len(self.client.get(url, {'author_id': author_id, 'status': 'Available'}).json()['results']), 5)
+
+    def test_unchanged_poll_is_a_304_without_queries(self):
+        url = reverse('api_availability')
+        ids = ','.join(str(book.id) for book in self.books)
+        response = self.client.get(url, {'ids': ids})
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, {'ids': ids}, headers={'If-None-Match': etag}).status_code, 304)
+
+        # A rental changes availability, so the same poll gets fresh data
+        with self.captureOnCommitCallbacks(execute=True):
+            rent_book_for(User.objects.create(username='poller1'), self.books[0])
+        response = self.client.get(url, {'ids': ids}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['copies'], 0)
+
+
+@override_settings(SQL_INSTRUMENTATION=True)
+class SqlInstrumentationTests(TestCase):
+    def setUp(self):
+        sql_stats.reset()
+        books = make_books(6)
+        for i, book in enumerate(books):
+            user = User.objects.create(username=f'reader{i}')
+            RentBook.objects.create(user=user, book=book, first_name='R', last_name='R', email='r@example.com',
+                                    rental_start_date=timezone.now().date(), rental_end_date=timezone.now().date())
+
+    def test_flags_n_plus_one(self):
+        with self.assertLogs('libsys.sql', 'WARNING') as logs:
+            response = self.client.get(reverse('borrowed_books'))
+        self.assertTrue(any('Likely N+1 in borrowed_books' in line for line in logs.output))
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        # borrowed_books.html follows book.user and book.book once per row
+        report = {row['url_name']: row for row in sql_stats.report()}
+        flagged = dict(report['borrowed_books']['n_plus_one'])
+        self.assertTrue(any('"auth_user"' in sql and count == 6 for sql, count in flagged.items()), flagged)
+        self.assertContains(self.client.get(reverse('admin_dashboard')), 'borrowed_books')
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x'  LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) AND name = 'y' LIMIT 21"),
+        )
+
+    def test_unresolved_paths_share_one_key(self):
+        for path in ['/no-such-page/', '/wp-admin/setup.php']:
+            self.assertEqual(self.client.get(path).status_code, 404)
+        self.assertEqual([row['url_name'] for row in sql_stats.report()], ['<unresolved>'])
+
+    @override_settings(SQL_SLOW_QUERY_MS=0)
+    def test_logs_slow_queries(self):
+        with self.assertLogs('libsys.sql', 'WARNING') as logs:
+            self.client.get(reverse('borrowed_books'))
+        self.assertTrue(any('Slow query' in line for line in logs.output))
+
+
+class DashboardRollupTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.author = Author.objects.create(name='Rollup Author')
+
+    def make_book(self, book_id, genre='Comic', copies=1):
+        return Book.objects.create(book_id=book_id, name=book_id, author=self.author, genre=genre, rent='100',
+                                   status='Available', copies=copies)
+
+    def rent(self, user, book, end_date):
+        return RentBook.objects.create(user=user, book=book, first_name='R', last_name='R', email='r@example.com',
+                                       rental_start_date=self.today, rental_end_date=end_date)
+
+    def test_signals_match_rebuild(self):
+        # Deltas are applied once the writing transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            comic, fiction = self.make_book('R1'), self.make_book('R2', genre='Fiction', copies=2)
+            user = User.objects.create(username='rollup1')
+            rent_book_for(user, comic)  # last copy: the book becomes Unavailable
+            self.rent(user, fiction, self.today - timedelta(days=3))
+            Payment.objects.create(user=user, payment_method='upi', upi_id='x@upi', amount=250)
+            Payment.objects.create(user=user, payment_method='upi', upi_id='x@upi', amount=750)
+            profile = UserProfile.objects.get(user=user)
+            profile.is_subscribed = True
+            profile.save()
+            fiction.genre = 'Romance'
+            fiction.save()
+
+        with self.assertNumQueries(1):
+            totals = dashboard_totals(self.today)
+        self.assertEqual(totals['books_by_status'], {'Unavailable': 1, 'Available': 1})
+        self.assertEqual([genre for genre, _, _ in totals['books_by_genre']], ['Comic', 'Romance'])
+        self.assertEqual((totals['active_rentals'], totals['overdue_rentals']), (1, 1))
+        self.assertEqual(totals['subscribers'], 1)
+        self.assertEqual(totals['revenue'][-1], (self.today, 1000))
+
+        # Incremental totals agree with a full rebuild
+        out = StringIO()
+        call_command('reconcile_rollups', stdout=out)
+        self.assertIn('0 corrected', out.getvalue())
+        self.assertEqual(dashboard_totals(self.today), totals)
+
+        # Deleting the user cascades to rentals, payments and profile
+        with self.captureOnCommitCallbacks(execute=True):
+            user.delete()
+        totals = dashboard_totals(self.today)
+        self.assertEqual((totals['active_rentals'], totals['overdue_rentals'], totals['subscribers']), (0, 0, 0))
+        self.assertEqual(totals['revenue_total'], 0)
+
+    def test_reconcile_repairs_drift(self):
+        Book.objects.bulk_create([Book(book_id='D1', name='D1', author=self.author, genre='Comic', rent='100',
+                                       status='Available', copies=1)])
+        self.assertEqual(dashboard_totals(self.today)['books_total'], 0)
+        out = StringIO()
+        call_command('reconcile_rollups', 'books', stdout=out)
+        self.assertIn('books:Comic:Available: 0 -> 1', out.getvalue())
+        self.assertEqual(dashboard_totals(self.today)['books_total'], 1)
+
+
+class OverdueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = timezone.now().date()
+        books = make_books(2)
+        users = [User.objects.create(username=f'late{i}') for i in range(2)]
+        for user, book, days_late in [(users[0], books[0], 3), (users[0], books[1], 10), (users[1], books[0], 1)]:
+            RentBook.objects.create(user=user, book=book, first_name='a', last_name='b', email='a@b.com',
+                                    rental_start_date=cls.today - timedelta(days=days_late + 7),
+                                    rental_end_date=cls.today - timedelta(days=days_late))
+        # Not overdue yet
+        RentBook.objects.create(user=users[1], book=books[1], first_name='a', last_name='b', email='a@b.com',
+                                rental_start_date=cls.today, rental_end_date=cls.today + timedelta(days=7))
+
+    def test_overdue_days_come_from_the_query(self):
+        with self.assertNumQueries(1):
+            days = sorted((r.user.username, r.book.name, r.overdue_days.days) for r in overdue_rentals(self.today))
+        self.assertEqual(days, [('late0', 'Book 0', 3), ('late0', 'Book 1', 10), ('late1', 'Book 0', 1)])
+
+    def test_streaming_exports(self):
+        self.client.force_login(User.objects.get(username='late0'))
+        self.assertEqual(self.client.get(reverse('export_report', args=['overdue'])).status_code, 403)
+
+        self.client.force_login(User.objects.create(username='desk', is_staff=True))
+        response = self.client.get(reverse('export_report', args=['overdue']), {'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[-1], 'overdue_days')
+        self.assertEqual(len(lines), 4)
+
+        response = self.client.get(reverse('export_report', args=['borrowed']), {'format': 'jsonl', 'gzip': '1'})
+        rows = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(json.loads(rows[0])['user_username'], 'late0')
+
+    def test_snapshot_totals(self):
+        build_overdue_snapshot(self.today)
+        # Rebuilding the same day replaces the snapshot
+        snapshot = build_overdue_snapshot(self.today)
+        self.assertEqual(OverdueSnapshot.objects.count(), 1)
+        self.assertEqual((snapshot.overdue_rentals, snapshot.overdue_users, snapshot.overdue_books), (3, 2, 2))
+        late0 = snapshot.rows.get(kind='user', label='late0')
+        self.assertEqual((late0.overdue_rentals, late0.max_overdue_days), (2, 10))
+        book0 = snapshot.rows.get(kind='book', label='Book 0')
+        self.assertEqual((book0.overdue_rentals, book0.max_overdue_days), (2, 3))
+
+        response = self.client.get(reverse('overdue_books'))
+        self.assertContains(response, '10 days')
+
+
+class MembershipTests(TestCase):
+    def setUp(self):
+        membership_cache().clear()
+        self.user = User.objects.create(username='member1')
+        self.today = timezone.now().date()
+
+    def test_cached_until_changed(self):
+        self.assertFalse(has_active_membership(self.user))
+        with self.assertNumQueries(0):
+            self.assertFalse(has_active_membership(self.user))
+
+        # Saving the profile (as activate_plan does) drops the cached answer
+        profile = self.user.userprofile
+        profile.is_subscribed = True
+        profile.subscription_end_date = self.today + timedelta(days=30)
+        profile.save()
+        self.assertTrue(has_active_membership(self.user))
+        with self.assertNumQueries(0):
+            self.assertTrue(has_active_membership(self.user))
+
+    def test_expires_after_end_date(self):
+        UserProfile.objects.filter(user=self.user).update(
+            is_subscribed=True, subscription_end_date=self.today)
+        self.assertTrue(has_active_membership(self.user, today=self.today))
+        self.assertFalse(has_active_membership(self.user, today=self.today + timedelta(days=1)))
+
+    def test_payment_invalidates(self):
+        self.assertFalse(has_active_membership(self.user))
+        UserProfile.objects.filter(user=self.user).update(
+            is_subscribed=True, subscription_end_date=self.today + timedelta(days=180))
+        Payment.objects.create(user=self.user, payment_method='upi', upi_id='x@upi', amount=750)
+        self.assertTrue(has_active_membership(self.user))
+
+    @override_settings(MEMBERSHIP_CACHE_ALIAS='catalog')
+    def test_configured_cache_alias(self):
+        caches['catalog'].clear()
+        self.assertFalse(has_active_membership(self.user))
+        self.assertIsNotNone(caches['catalog'].get(f'libsys:membership:{self.user.pk}'))
+        self.assertIsNone(cache.get(f'libsys:membership:{self.user.pk}'))
+
+        # The signal handlers drop the entry from the same alias
+        profile = self.user.userprofile
+        profile.is_subscribed = True
+        profile.subscription_end_date = self.today + timedelta(days=30)
+        profile.save()
+        self.assertIsNone(caches['catalog'].get(f'libsys:membership:{self.user.pk}'))
+        self.assertTrue(has_active_membership(self.user))
+
+
+class SessionOverheadTests(TestCase):
+    """Fixed per-request cost of being logged in: session and request.user lookups."""
+
+    def setUp(self):
+        caches['sessions'].clear()
+        self.user = User.objects.create_user(username='session1', password='pw-session1', first_name='Sam')
+        self.assertTrue(self.client.login(username='session1', password='pw-session1'))
+
+    def assert_page_queries(self, count):
+        self.client.get(reverse('customer'))  # warm the caches
+        with self.assertNumQueries(count):
+            self.assertContains(self.client.get(reverse('customer')), 'Welcome, Sam')
+
+    def test_cached_db_sessions_cost_no_queries(self):
+        self.assert_page_queries(0)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions_cost_no_queries(self):
+        self.assertTrue(self.client.login(username='session1', password='pw-session1'))
+        self.assert_page_queries(0)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_db_sessions_cost_one_query(self):
+        self.assertTrue(self.client.login(username='session1', password='pw-session1'))
+        self.assert_page_queries(1)
+
+    def test_password_change_ends_other_sessions(self):
+        self.assert_page_queries(0)
+        self.user.set_password('pw-changed')
+        self.user.save()
+        self.assertFalse(self.client.get(reverse('membership')).wsgi_request.user.is_authenticated)
+
+    def test_profile_change_refreshes_cached_user(self):
+        self.assert_page_queries(0)
+        profile = UserProfile.objects.get(user=self.user)
+        profile.is_subscribed = True
+        profile.save()
+        response = self.client.get(reverse('customer'))
+        self.assertTrue(response.wsgi_request.user.userprofile.is_subscribed)
+
+
+class LoginWriteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='login1', password='pw-login1')
+
+    def test_login_leaves_the_profile_alone(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('login'), {'userid': 'login1', 'password': 'pw-login1'})
+        self.assertRedirects(response, reverse('customer'), fetch_redirect_response=False)
+        # The profile only appears joined into the user lookup
+        profile_queries = [q['sql'] for q in queries.captured_queries if 'libsys_userprofile' in q['sql']]
+        self.assertEqual(len(profile_queries), 1)
+        self.assertIn('auth_user', profile_queries[0])
+
+    def test_user_save_writes_only_edited_profile_fields(self):
+        user = User.objects.select_related('userprofile').get(id=self.user.id)
+        with self.assertNumQueries(1):
+            user.save(update_fields=['first_name'])
+
+        user.userprofile.subscription_end_date = timezone.now().date()
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        update = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "libsys_userprofile"')]
+        self.assertEqual(len(update), 1)
+        self.assertIn('subscription_end_date', update[0])
+        self.assertNotIn('is_subscribed', update[0])
+        self.assertEqual(UserProfile.objects.get(user=user).subscription_end_date, timezone.now().date())
+
+
+class MemberDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(7):
+            User.objects.create(username=f'dir{i}', first_name=f'First{i}', last_name='Member',
+                                email=f'dir{i}@{"school" if i < 3 else "corp"}.test')
+        UserProfile.objects.filter(user__username__in=['dir0', 'dir1', 'dir4']).update(is_subscribed=True)
+        self.client.force_login(User.objects.get(username='dir0'))
+        self.url = reverse('user_list')
+
+    def test_page_queries_dont_grow_with_members(self):
+        self.client.get(self.url)  # warm the session, user and count caches
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'status': 'subscribed', 'page_size': 2})
+        self.assertEqual([p.user.first_name for p in response.context['users']], ['First0', 'First1'])
+        self.assertContains(response, 'Subscribed Users (3)')
+        self.assertContains(response, 'Unsubscribed Users (4)')
+        self.assertContains(response, 'All Users (7)')
+        self.assertContains(response, '&status=subscribed">Next')
+
+        response = self.client.get(self.url, {'status': 'subscribed', 'page_size': 2,
+                                              'after': response.context['users'].next_cursor})
+        self.assertEqual([p.user.first_name for p in response.context['users']], ['First4'])
+
+    def test_search_by_name_or_email(self):
+        response = self.client.get(self.url, {'q': 'school.test'})
+        self.assertEqual(len(response.context['users']), 3)
+        self.assertEqual(response.context['counts'], {'all': 3, 'subscribed': 2, 'unsubscribed': 1})
+        response = self.client.get(self.url, {'q': 'first5', 'status': 'unsubscribed'})
+        self.assertEqual([p.user.email for p in response.context['users']], ['dir5@corp.test'])
+
+
+class ProfileHistoryTests(TestCase):
+    def setUp(self):
+        caches['sessions'].clear()
+        self.user = User.objects.create(username='historian1')
+        self.client.force_login(self.user)
+        self.today = timezone.now().date()
+        books = make_books(30)
+        for i, book in enumerate(books):
+            rental = RentBook.objects.create(
+                user=self.user, book=book, first_name='H', last_name='H', email='h@example.com',
+                rental_start_date=self.today - timedelta(days=60 - i), rental_end_date=self.today + timedelta(days=i))
+            if i < 27:
+                return_rental(rental, today=self.today)
+
+    def test_profile_costs_fixed_queries(self):
+        self.client.get(reverse('view_profile'))  # warm the session, user and membership caches
+        # Summary, current rentals and one page of history from each of RentBook and the archive
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('view_profile'))
+        summary = response.context['summary']
+        self.assertEqual((summary.total_rentals, summary.open_rentals, summary.returned_rentals), (30, 3, 27))
+        self.assertEqual(summary.last_rented_on, self.today - timedelta(days=31))
+        self.assertEqual([r.book.name for r in response.context['rented_books']], ['Book 27', 'Book 28', 'Book 29'])
+
+        # History runs newest first, HISTORY_PAGE_SIZE rows at a time
+        history = response.context['past_rentals']
+        self.assertEqual(history.items[0].book.name, 'Book 26')
+        self.assertEqual(len(history), 20)
+        older = self.client.get(reverse('view_profile'), {'after': history.next_cursor}).context['past_rentals']
+        self.assertEqual([r.book.name for r in older][-1], 'Book 0')
+        self.assertFalse(older.has_next)
+
+    def test_summary_follows_returns_and_deletes(self):
+        rental = RentBook.objects.filter(user=self.user, returned_on__isnull=True).first()
+        return_rental(rental)
+        self.assertEqual(self.user.rental_summary.open_rentals, 2)
+        RentBook.objects.filter(id=rental.id).delete()
+        summary = RentalSummary.objects.get(user=self.user)
+        self.assertEqual((summary.total_rentals, summary.open_rentals), (29, 2))
+        self.user.delete()
+        self.assertFalse(RentalSummary.objects.exists())
+
+    def test_history_spans_the_archive(self):
+        # Rentals 0-9 were returned "long ago"
+        RentBook.objects.filter(book__name__in=[f'Book {i}' for i in range(10)]).update(
+            returned_on=self.today - timedelta(days=400))
+        out = StringIO()
+        call_command('archive_rentals', '--older-than=365', '--batch-size=4', stdout=out)
+        self.assertIn('Archived 10 rentals', out.getvalue())
+        self.assertEqual(ArchivedRental.objects.count(), 10)
+        self.assertEqual(RentBook.objects.filter(user=self.user).count(), 20)
+        self.assertEqual(RentBook.objects.filter(returned_on__isnull=True).count(), 3)
+        # Nothing left to move on a second run
+        call_command('archive_rentals', '--older-than=365', stdout=out)
+        self.assertEqual(ArchivedRental.objects.count(), 10)
+
+        url = reverse('view_profile')
+        first = self.client.get(url).context['past_rentals']
+        second = self.client.get(url, {'after': first.next_cursor}).context['past_rentals']
+        self.assertEqual([r.book.name for r in [*first, *second]], [f'Book {i}' for i in range(26, -1, -1)])
+        self.assertIsInstance(second.items[-1], ArchivedRental)
+        back = self.client.get(url, {'before': second.prev_cursor}).context['past_rentals']
+        self.assertEqual([r.id for r in back], [r.id for r in first])
+
+        # Archived rentals still count in the summary and the borrowed export
+        self.assertEqual(RentalSummary.objects.get(user=self.user).total_rentals, 30)
+        self.client.force_login(User.objects.create(username='desk', is_staff=True))
+        rows = b''.join(self.client.get(reverse('export_report', args=['borrowed'])).streaming_content)
+        self.assertEqual(len(rows.decode().strip().splitlines()), 31)
+
+
+def reload_urls():
+    # The URLconf picks sync or async views from settings.ASYNC_VIEWS at import time
+    for name in ('libsys.urls', 'library.urls'):
+        importlib.reload(sys.modules[name])
+    clear_url_caches()
+
+
+class AsyncViewTests(TestCase):
+    """The async views must run end to end without a sync-only ORM call."""
+
+    def setUp(self):
+        self.addCleanup(reload_urls)
+        self.enterContext(override_settings(ASYNC_VIEWS=True))
+        reload_urls()
+        cache.clear()
+        caches['catalog'].clear()
+        catalog_search.reset()
+        self.author = Author.objects.create(name='Ursula Le Guin')
+        self.books = make_books(3, author=self.author)
+        self.user = User.objects.create(username='async1')
+        profile = self.user.userprofile
+        profile.is_subscribed = True
+        profile.subscription_end_date = timezone.now().date() + timedelta(days=30)
+        profile.save()
+
+    def test_routed_under_asgi(self):
+        for url in (reverse('search_authors'), reverse('rent_book'), reverse('api_books')):
+            self.assertTrue(iscoroutinefunction(resolve(url).func), url)
+
+    async def test_search_and_genre(self):
+        response = await self.async_client.get(reverse('search_authors'), {'query': 'urs'})
+        self.assertEqual(response.json()[0]['name'], 'Ursula Le Guin')
+
+        url = reverse('books_by_genre', args=['Comic'])
+        self.assertContains(await self.async_client.get(url), 'Book 2')
+        # update() sends no signals, so the second request is still served from the cache
+        await Book.objects.filter(id=self.books[2].id).aupdate(name='Renamed')
+        self.assertContains(await self.async_client.get(url), 'Book 2')
+        self.assertEqual((await self.async_client.get(reverse('books_by_genre', args=['Poetry']))).status_code, 404)
+
+    async def test_member_views(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('rent_book'))
+        self.assertContains(response, 'Book 0')
+        response = await self.async_client.get(reverse('book_details', args=[self.books[0].id]))
+        self.assertContains(response, 'Ursula Le Guin')
+
+        self.assertEqual(await ahas_active_membership(self.user), True)
+
+    async def test_api_poll(self):
+        url = reverse('api_availability')
+        response = await self.async_client.get(url, {'ids': self.books[0].id})
+        self.assertEqual(response.json()['results'][0]['copies'], 1)
+        response = await self.async_client.get(url, {'ids': self.books[0].id}, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+
+class BookReturnTests(TestCase):
+    def setUp(self):
+        self.book = make_books(1)[0]
+        self.user = User.objects.create(username='returner1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rental = rent_book_for(self.user, self.book)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.copies, self.book.status), (0, 'Unavailable'))
+
+    def test_return_puts_the_copy_back(self):
+        self.client.force_login(self.user)
+        url = reverse('return_book', args=[self.rental.id])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertRedirects(self.client.post(url), reverse('view_profile'))
+        self.rental.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(self.rental.returned_on, timezone.now().date())
+        self.assertEqual((self.book.copies, self.book.status), (1, 'Available'))
+        self.assertEqual(BookCopy.objects.get(id=self.rental.copy_id).status, 'Available')
+        self.assertEqual(dashboard_totals()['active_rentals'], 0)
+
+        # A second submit changes nothing, and the copy can be rented again
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url)
+            self.assertIsNotNone(rent_book_for(self.user, self.book))
+        self.assertEqual(RentBook.objects.filter(returned_on__isnull=True).count(), 1)
+
+    def test_withdrawn_title_stays_withdrawn(self):
+        book = Book.objects.create(book_id='W1', name='Withdrawn', author=self.book.author, genre='Comic',
+                                   rent='100', status='Withdrawn', copies=2)
+        self.assertIsNone(rent_book_for(self.user, book))
+
+        # Neither a recount nor a restock puts the title back on the shelf
+        refresh_availability(book.id)
+        book.copies = 4
+        book.save(update_fields=['copies'])
+        book.refresh_from_db(fields=['copies', 'status'])
+        self.assertEqual((book.copies, book.status), (4, 'Withdrawn'))
+
+    def test_restocking_an_out_of_stock_title(self):
+        # setUp rented the only copy
+        self.assertEqual(self.client.post(reverse('edit_book', args=[self.book.id]),
+                                          {'field': 'copies', 'value': '3'}).status_code, 302)
+        self.book.refresh_from_db(fields=['copies', 'status'])
+        self.assertEqual((self.book.copies, self.book.status), (3, 'Available'))
+        self.assertIsNotNone(rent_book_for(User.objects.create(username='next_reader'), self.book))
+
+    def test_only_the_renter_can_return(self):
+        self.client.force_login(User.objects.create(username='someone_else'))
+        self.assertEqual(self.client.post(reverse('return_book', args=[self.rental.id])).status_code, 404)
+
+    def test_staff_check_in(self):
+        url = reverse('check_in', args=[self.rental.copy_id])
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+        self.client.force_login(User.objects.create(username='desk', is_staff=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertRedirects(self.client.post(url), reverse('borrowed_books'))
+        self.assertIsNotNone(RentBook.objects.get(id=self.rental.id).returned_on)
+        self.assertFalse(check_in_copy(self.rental.copy_id))
+        self.assertEqual(self.client.post(reverse('check_in', args=[0])).status_code, 404)
+
+
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = timezone.now().date()
+        books = make_books(3)
+        reader = User.objects.create(username='reader', first_name='Rea', email='reader@example.com')
+        for book, days_left in [(books[0], 1), (books[1], -4), (books[2], 20)]:
+            RentBook.objects.create(user=reader, book=book, first_name='Rea', last_name='D', email=reader.email,
+                                    rental_start_date=cls.today - timedelta(days=10),
+                                    rental_end_date=cls.today + timedelta(days=days_left))
+        # Returned late: no overdue notice
+        RentBook.objects.create(user=reader, book=books[0], first_name='Rea', last_name='D', email=reader.email,
+                                rental_start_date=cls.today - timedelta(days=30),
+                                rental_end_date=cls.today - timedelta(days=20), returned_on=cls.today)
+        cls.member = User.objects.create(username='ending', email='ending@example.com')
+        UserProfile.objects.filter(user=cls.member).update(
+            is_subscribed=True, subscription_end_date=cls.today + timedelta(days=3))
+        # No address to send to
+        nobody = User.objects.create(username='nomail')
+        UserProfile.objects.filter(user=nobody).update(
+            is_subscribed=True, subscription_end_date=cls.today + timedelta(days=3))
+
+    def send(self, *args):
+        call_command('send_notifications', *args, '--batch-size', '1', stdout=StringIO())
+
+    def test_sends_each_notice_once(self):
+        self.send()
+        subjects = sorted((message.subject, message.to[0]) for message in mail.outbox)
+        self.assertEqual(subjects, [
+            ('Your library book is due soon', 'reader@example.com'),
+            ('Your library book is overdue', 'reader@example.com'),
+            ('Your library membership is ending', 'ending@example.com'),
+        ])
+        overdue = next(message for message in mail.outbox if 'overdue' in message.subject)
+        self.assertIn('Book 1', overdue.body)
+        self.assertEqual(NotificationLog.objects.count(), 3)
+
+        # A rerun finds everything in the ledger
+        mail.outbox = []
+        self.send()
+        self.assertEqual(mail.outbox, [])
+
+        # A renewed membership that is ending again gets a new notice
+        UserProfile.objects.filter(user=self.member).update(subscription_end_date=self.today + timedelta(days=5))
+        self.send('membership_expiring')
+        self.assertEqual([message.to for message in mail.outbox], [['ending@example.com']])
+
+    def test_plain_text_bodies_are_not_escaped(self):
+        book = Book.objects.create(book_id='TJ', name='Tom & Jerry', author=Author.objects.first(),
+                                   genre='Comic', rent='100', status='Available')
+        user = User.objects.create(username='obrien', first_name="O'Brien", email='obrien@example.com')
+        RentBook.objects.create(user=user, book=book, first_name="O'Brien", last_name='B', email=user.email,
+                                rental_start_date=self.today, rental_end_date=self.today + timedelta(days=1))
+        self.send('due_soon')
+        body = next(message.body for message in mail.outbox if message.to == [user.email])
+        self.assertIn("Hello O'Brien,", body)
+        self.assertIn('"Tom & Jerry"', body)
+
+    def test_dry_run_sends_nothing(self):
+        out = StringIO()
+        call_command('send_notifications', '--dry-run', stdout=out)
+        self.assertIn('overdue: would send 1', out.getvalue())
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(NotificationLog.objects.exists())
+
+
+class ReplicaRoutingTests(TestCase):
+    def test_router_without_replicas(self):
+        with read_routing():
+            self.assertEqual(Book.objects.all().db, 'default')
+            self.assertEqual(read_replica(), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_catalog_reads_use_the_replica_until_a_write(self):
+        # Outside a request only explicit report reads use the replica
+        self.assertEqual(Book.objects.all().db, 'default')
+        self.assertEqual(read_replica(), 'replica_1')
+        with read_routing():
+            self.assertEqual(Book.objects.all().db, 'replica_1')
+            self.assertEqual(OverdueSnapshot.objects.all().db, 'replica_1')
+            self.assertEqual(RentBook.objects.all().db, 'default')
+            self.assertEqual(UserProfile.objects.all().db, 'default')
+            make_books(1)
+            # Read-your-writes for the rest of the request
+            self.assertEqual(Book.objects.all().db, 'default')
+            self.assertEqual(read_replica(), 'default')
+        with read_routing(pinned=True):
+            self.assertEqual(Book.objects.all().db, 'default')
+
+    # replica_1 isn't configured, so any read routed to it would fail
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_book_writes_read_the_primary(self):
+        book = make_books(1)[0]
+        response = self.client.post(reverse('edit_book', args=[book.id]), {'field': 'name', 'value': 'Renamed'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Book.objects.get(id=book.id).name, 'Renamed')
+        self.client.get(reverse('delete_book', args=[book.id]))
+        self.assertFalse(Book.objects.filter(id=book.id).exists())
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_catalog_refills_read_the_primary_after_a_change(self):
+        caches['catalog'].clear()
+        bump_catalog_version()
+        with read_routing():
+            self.assertEqual(cached_catalog('routing', lambda: Book.objects.all().db), 'default')
+            caches['catalog'].delete(FRESH_KEY)
+            bump_catalog_version()
+            caches['catalog'].delete(FRESH_KEY)
+            self.assertEqual(cached_catalog('routing', lambda: Book.objects.all().db), 'replica_1')
+
+    # 'default' stands in for the replica so the requests can run
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_own_return_sticks_to_the_primary(self):
+        user = User.objects.create(username='sticky')
+        book = make_books(1)[0]
+        rental = rent_book_for(user, book)
+        self.client.force_login(user)
+        self.assertNotIn(STICKY_COOKIE, self.client.get(reverse('books_catalog')).cookies)
+
+        response = self.client.post(reverse('return_book', args=[rental.id]))
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 10)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class TwoDatabaseReplicaTests(TransactionTestCase):
+    """Routing against a real second SQLite database standing in for a replica.
+
+    Nothing copies rows between the two, so a row written to only one of them
+    shows which connection a read went to.
+    """
+
+    # replica_1 is added in setUpClass, once it exists: the test runner checks
+    # (and would try to create) every alias listed here before that
+    databases = {'default'}
+
+    @classmethod
+    def setUpClass(cls):
+        handle, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        configured = connections.configure_settings({
+            'default': connections.settings['default'],
+            'replica_1': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': cls.replica_path,
+                          'TEST': {'NAME': cls.replica_path}},
+        })
+        connections.settings['replica_1'] = configured['replica_1']
+        call_command('migrate', database='replica_1', verbosity=0)
+        cls.databases = {'default', 'replica_1'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica_1'].close()
+        del connections['replica_1']
+        del connections.settings['replica_1']
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        Book.objects.create(book_id='P1', name='On the primary', author=Author.objects.create(name='Pat'),
+                            genre='Comic', rent='100', status='Available')
+        replica_author = Author.objects.using('replica_1').create(name='Rae')
+        Book.objects.using('replica_1').create(book_id='R1', name='On the replica', author=replica_author,
+                                               genre='Comic', rent='100', status='Available')
+        # The writes above bumped the catalog version; start from a cold cache with no fresh window
+        caches['catalog'].clear()
+
+    def catalog_names(self):
+        return [book['name'] for book in self.client.get(reverse('api_books'), {'fields': 'name'}).json()['results']]
+
+    def test_catalog_reads_go_to_the_replica(self):
+        self.assertEqual(self.catalog_names(), ['On the replica'])
+        # Outside a request the router stays on the primary
+        self.assertEqual(list(Book.objects.values_list('name', flat=True)), ['On the primary'])
+        with read_routing():
+            self.assertEqual(list(Book.objects.values_list('name', flat=True)), ['On the replica'])
+        with read_routing(pinned=True):
+            self.assertEqual(list(Book.objects.values_list('name', flat=True)), ['On the primary'])
+
+    def test_own_write_pins_reads_and_never_reaches_the_replica(self):
+        user = User.objects.create(username='pinned')
+        rental = rent_book_for(user, Book.objects.get(book_id='P1'))
+        self.client.force_login(user)
+
+        response = self.client.post(reverse('return_book', args=[rental.id]))
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertIsNotNone(RentBook.objects.get(id=rental.id).returned_on)
+        self.assertFalse(RentBook.objects.using('replica_1').exists())
+        self.assertFalse(BookCopy.objects.using('replica_1').exists())
+
+        # The sticky cookie keeps this member's catalog reads on the primary
+        caches['catalog'].clear()
+        self.assertEqual(self.catalog_names(), ['On the primary'])
+        self.client.cookies.pop(STICKY_COOKIE)
+        caches['catalog'].clear()
+        self.assertEqual(self.catalog_names(), ['On the replica'])
+
+    def test_catalog_refill_after_a_change_reads_the_primary(self):
+        bump_catalog_version()
+        self.assertEqual(self.catalog_names(), ['On the primary'])
+        caches['catalog'].clear()
+        self.assertEqual(self.catalog_names(), ['On the replica'])
+
+
+class ConcurrentRentalTests(TransactionTestCase):
+    """Many threads renting the same title must never take more copies than exist.
+
+    The bench_rentals command runs the same race and reports rentals per second.
+    """
+
+    THREADS = 16
+    ATTEMPTS_PER_THREAD = 25
+    COPIES = 100
+
+    def test_no_overselling_under_contention(self):
+        book = make_books(1)[0]
+        Book.objects.filter(id=book.id).update(copies=self.COPIES)
+        sync_copies([book.id])
+        users = User.objects.bulk_create(User(username=f'renter{i}') for i in range(self.THREADS))
+        book = Book.objects.only('id', 'status', 'rental_days').get(id=book.id)
+        rented = []
+        errors = []
+        start = threading.Barrier(self.THREADS)
+
+        def renter(user):
+            try:
+                start.wait()
+                for _ in range(self.ATTEMPTS_PER_THREAD):
+                    while True:
+                        try:
+                            rental = rent_book_for(user, book)
+                            break
+                        except OperationalError:
+                            # SQLite's shared-cache test database reports lock
+                            # contention instead of waiting; just try again
+                            time.sleep(0.001)
+                    if rental is not None:
+                        rented.append(rental.id)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=renter, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        book.refresh_from_db(fields=['copies', 'status'])
+        self.assertEqual(len(rented), self.COPIES)
+        self.assertEqual(RentBook.objects.filter(book=book).count(), self.COPIES)
+        self.assertEqual(book.copies, 0)
+        self.assertEqual(book.status, 'Unavailable')
@@ -0,0 +1,132 @@
+# thumbnails.py
+"""Fixed-size cover thumbnails in JPEG, WebP and (when Pillow supports it) AVIF.
+
+Derivatives are stored under ``thumbnails/`` in the default storage, named by
+the SHA-256 of the source image plus size and format, so the same cover
+uploaded twice shares its thumbnails and a replaced cover gets new ones. They
+are generated when BookForm saves a new cover, or lazily the first time a
+template asks for them.
+"""
+import hashlib
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from .storage import is_blob_name
+
+
+logger = logging.getLogger(__name__)
+
+# name -> (width, height) in CSS pixels; a 2x variant is produced for each
+DEFAULT_SIZES = {
+    'small': (100, 150),
+    'medium': (300, 450),
+}
+
+# (format, Pillow format name, mime type, save options), best compression first
+FORMATS = [
+    ('avif', 'AVIF', 'image/avif', {'quality': 50}),
+    ('webp', 'WEBP', 'image/webp', {'quality': 75, 'method': 4}),
+    ('jpg', 'JPEG', 'image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}),
+]
+
+DENSITIES = (1, 2)
+
+
+def thumbnail_sizes():
+    return getattr(settings, 'THUMBNAIL_SIZES', DEFAULT_SIZES)
+
+
+def available_formats():
+    # AVIF needs a Pillow built with libavif; JPEG is always the fallback
+    return [fmt for fmt in FORMATS if fmt[0] != 'avif' or features.check('avif')]
+
+
+def source_hash(field_file):
+    """SHA-256 of the cover's bytes, cached by name and size so it's read once."""
+    storage, name = field_file.storage, field_file.name
+    if is_blob_name(name):
+        # Content-addressed covers carry their hash in the name
+        return os.path.splitext(os.path.basename(name))[0]
+    key = f'libsys:cover-hash:{name}:{storage.size(name)}'
+    digest = cache.get(key)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with storage.open(name, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        cache.set(key, digest, None)
+    return digest
+
+
+def thumbnail_name(digest, width, height, ext):
+    return f'thumbnails/{digest[:2]}/{digest}-{width}x{height}.{ext}'
+
+
+def _render(source, width, height, pil_format, options):
+    image = ImageOps.fit(ImageOps.exif_transpose(source), (width, height), Image.LANCZOS)
+    if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def ensure_thumbnails(field_file, size_names=None):
+    """Generate any missing derivatives for ``field_file``.
+
+    Returns {size name: {ext: {density: storage name}}}. Returns an empty dict
+    (callers fall back to the original) if the source can't be read as an image.
+    """
+    storage = default_storage
+    sizes = thumbnail_sizes()
+    source = None
+    result = {}
+    try:
+        digest = source_hash(field_file)
+        for size_name in size_names or sizes:
+            # Remember which sizes are done so list pages don't stat every variant
+            done_key = f'libsys:thumbs:{digest}:{size_name}'
+            variants = cache.get(done_key)
+            if variants is None:
+                width, height = sizes[size_name]
+                variants = {}
+                for ext, pil_format, _mime, options in available_formats():
+                    for density in DENSITIES:
+                        w, h = width * density, height * density
+                        name = thumbnail_name(digest, w, h, ext)
+                        if not storage.exists(name):
+                            if source is None:
+                                with field_file.storage.open(field_file.name, 'rb') as f:
+                                    source = Image.open(f)
+                                    source.load()
+                            name = storage.save(name, ContentFile(_render(source, w, h, pil_format, options)))
+                        variants.setdefault(ext, {})[density] = name
+                cache.set(done_key, variants, 24 * 60 * 60)
+            result[size_name] = variants
+    except (OSError, Image.DecompressionBombError):
+        logger.warning("Could not build thumbnails for %s", field_file.name, exc_info=True)
+        return {}
+    return result
+
+
+def cover_sources(field_file, size_name):
+    """Return [(mime type, srcset), ...] best format first, or [] if unavailable."""
+    variants = ensure_thumbnails(field_file, [size_name]).get(size_name)
+    if not variants:
+        return []
+    storage = default_storage
+    sources = []
+    for ext, _pil_format, mime, _options in available_formats():
+        if ext not in variants:
+            continue
+        srcset = ', '.join(f'{storage.url(name)} {density}x' for density, name in sorted(variants[ext].items()))
+        sources.append((mime, srcset))
+    return sources
@@ -1,21 +1,32 @@
 from django.urls import path
 from django.views.generic import TemplateView
 from .import views
+from . import api
 from django.conf import settings
 from django.conf.urls.static import static
 
+
+def read_view(sync_view, async_view):
+    # Under ASGI (settings.ASYNC_VIEWS) the read-heavy views run as coroutines
+    return async_view if settings.ASYNC_VIEWS else sync_view
+
+
 urlpatterns = [
     path('', views.home, name='home'),
     path('register/', views.register, name='register'),
     path('login/', views.login_view, name='login'),
     path('author/', views.author_page, name='author'),
-    path('search-authors/', views.search_authors, name='search_authors'),
-    path('genre/<str:genre>/', views.books_by_genre, name='books_by_genre'),
+    path('search-authors/', read_view(views.search_authors, views.asearch_authors), name='search_authors'),
+    path('search-books/', read_view(views.search_books, views.asearch_books), name='search_books'),
+    path('genre/<str:genre>/', read_view(views.books_by_genre, views.abooks_by_genre), name='books_by_genre'),
     path('membership/', views.membership_page, name='membership'),
     path('activate_plan/<str:plan_duration>/', views.activate_plan, name='activate_plan'),
-    path('rent/', views.rent_book, name='rent_book'),
+    path('rent/', read_view(views.rent_book, views.arent_book), name='rent_book'),
     path('rent/<int:book_id>/', views.rent_this_book, name='rent_this_book'),
-    path('book/<int:book_id>/', views.book_details, name='book_details'),
+    path('rentals/<int:rental_id>/return/', views.return_book, name='return_book'),
+    path('copies/<int:copy_id>/check-in/', views.check_in, name='check_in'),
+    path('book/<int:book_id>/', read_view(views.book_details, views.abook_details), name='book_details'),
+    path('book/<int:book_id>/pdf/', views.book_pdf, name='book_pdf'),
     path('payment/', views.payment_view, name='payment'),
     path('customer/', views.customer, name='customer'),
     path('profile/', views.view_profile, name='view_profile'),
@@ -29,7 +40,12 @@ urlpatterns = [
     path('delete/<int:id>/', views.delete_book, name='delete_book'),  # Changed to 'id'
     path('overdue-books/', views.overdue_books_view, name='overdue_books'),
     path('borrowed_books/', views.borrowed_books, name='borrowed_books'),
+    path('export/<str:report>/', views.export_report, name='export_report'),
     path('logout/', views.admin_logout, name='admin_logout'),
+    path('api/books/', read_view(api.books, api.abooks), name='api_books'),
+    path('api/books/<int:book_id>/', read_view(api.book, api.abook), name='api_book'),
+    path('api/authors/', read_view(api.authors, api.aauthors), name='api_authors'),
+    path('api/availability/', read_view(api.availability, api.aavailability), name='api_availability'),
 ]
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
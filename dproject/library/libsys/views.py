@@ -1,17 +1,53 @@
-from django.shortcuts import render,redirect,reverse,get_object_or_404,get_list_or_404
+from django.shortcuts import render,redirect,reverse,get_object_or_404,get_list_or_404,aget_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import logout,authenticate,login
 from .forms import RegistrationForm,LoginForm,BookForm,PaymentForm
 from django.contrib.auth.models import User
-from .models import Payment, Book, RentBook, UserProfile, Author
-from django.core.exceptions import ValidationError
+from .models import Payment, Book, BookCopy, RentBook, UserProfile, Author
+from django.core.exceptions import ValidationError, PermissionDenied
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.core.validators import validate_email
-from django.http import HttpResponse,JsonResponse
+from django.http import HttpResponse,JsonResponse,Http404,StreamingHttpResponse
+from django.conf import settings
+from django.db import router
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_POST
 from dateutil.relativedelta import relativedelta
-
+from .pagination import paginate_request, get_page_size
+from .catalog_cache import cached_catalog, catalog_version, acached_catalog, acatalog_version
+from .search import catalog_search
+from .rentals import rent_book_for, return_rental, check_in_copy
+from .overdue import overdue_rentals, latest_snapshot
+from .membership import has_active_membership, ahas_active_membership
+from .streaming import serve_file
+from .exports import REPORTS, FORMATS, stream_report, export_filename
+from .instrumentation import sql_stats
+from .rollups import dashboard_totals
+from .members import STATUSES as MEMBER_STATUSES, member_counts, member_directory
+from .history import current_rentals, past_rentals, rental_summary
+from asgiref.sync import sync_to_async
+import os
+from urllib.parse import urlencode
+
+# Static pages are cached whole; membership is left out because its forms carry a per-visitor CSRF token
+static_page_cache = cache_page(settings.CATALOG_CACHE_TIMEOUT, cache=settings.CATALOG_CACHE_ALIAS, key_prefix='static')
+
+
+def cached_catalog_page(request, name, queryset):
+    # One page of ``queryset`` cached per catalog version and cursor
+    parts = (request.GET.get('after', ''), request.GET.get('before', ''), get_page_size(request))
+    return cached_catalog(name, lambda: paginate_request(request, queryset), *parts)
+
+
+async def acached_catalog_page(request, name, queryset):
+    # Async cached_catalog_page: the page query only runs (in a thread) on a cache miss
+    parts = (request.GET.get('after', ''), request.GET.get('before', ''), get_page_size(request))
+    return await acached_catalog(name, sync_to_async(lambda: paginate_request(request, queryset)), *parts)
+
+
+@static_page_cache
 def home(request):
     return render(request, 'account/home.html')
 
@@ -37,10 +73,7 @@ def register(request):
                     first_name=firstname,
                     last_name=lastname
                 )
-
-                # Check if the UserProfile already exists before creating a new one
-                if not UserProfile.objects.filter(user=user).exists():
-                    UserProfile.objects.create(user=user)
+                # create_user_profile (models.py) has already made the UserProfile
 
                 messages.success(request, 'Registration successful! Please log in.')
                 return redirect('login')
@@ -60,7 +93,7 @@ def login_view(request):
             # Authenticate the user
             user = authenticate(username=userid, password=password)
             if user is not None:
-                # Check if the user has a UserProfile
+                # Check if the user has a UserProfile (joined in by the auth backend, so no extra query)
                 if hasattr(user, 'userprofile'):  # Safely check if UserProfile exists
                     login(request, user)
                     return redirect('customer')  # Redirect to the dashboard after login
@@ -72,6 +105,7 @@ def login_view(request):
         form = LoginForm()
 
     return render(request, 'account/login.html', {'form': form})
+@static_page_cache
 def author_page(request):
     return render(request, 'account/author.html')
 def membership_page(request):
@@ -195,9 +229,11 @@ def payment_view(request):
         user_profile = request.user.userprofile
         user_profile.is_subscribed = True
         user_profile.subscription_start_date = datetime.now().date()
-        user_profile.subscription_end_date = datetime.now().date() + timedelta(
-            days=365) if plan_type == '1-year' else timedelta(days=730) if plan_type == '2-year' else timedelta(
-            days=180)
+        user_profile.subscription_end_date = datetime.now().date() + (
+            timedelta(days=365) if plan_type == '1-year' else
+            timedelta(days=730) if plan_type == '2-year' else
+            timedelta(days=180)
+        )
         user_profile.save()
 
         messages.success(request, f"Payment successful! You have activated the {plan_type.replace('-', ' ')} plan.")
@@ -216,17 +252,12 @@ def login_required_view(request, plan_id):
 
 @login_required
 def rent_book(request):
-    current_date = timezone.now().date()
-    one_year_ago = current_date - timedelta(days=365)
-
-    # Check if the user has made a payment within the last year
-    membership = Payment.objects.filter(user=request.user, payment_date__gte=one_year_ago).exists()
-
-    if not membership:
+    # Answered from the user's subscription end date (cached) instead of payment history
+    if not has_active_membership(request.user):
         messages.error(request, "You must have an active membership to rent a book.")
         return redirect('membership')
 
-    books = Book.objects.filter(status='Available')
+    books = cached_catalog_page(request, 'rent_book', Book.objects.for_catalog().filter(status='Available'))
     context = {'books': books}
     return render(request, 'account/rent_book.html', context)
 
@@ -234,61 +265,105 @@ def rent_book(request):
 
 @login_required
 def rent_this_book(request, book_id):
-    book = get_object_or_404(Book, id=book_id)
-
-    # Check if the book is available
-    if book.status == 'Available' and book.copies > 0:
-        # Reduce the number of copies by 1
-        book.copies -= 1
-
-        # If no more copies are left, mark the book as Unavailable
-        if book.copies == 0:
-            book.status = 'Unavailable'
-
-        # Save the updated book status
-        book.save()
-
-        # Use the rental_days set by the admin to calculate the rental period
-        rental_start_date = timezone.now().date()  # Set the current date
-        rental_end_date = rental_start_date + timedelta(days=book.rental_days)  # Use the admin-defined rental period
-
-        RentBook.objects.create(
-            user=request.user,
-            book=book,
-            first_name=request.user.first_name,
-            last_name=request.user.last_name,
-            email=request.user.email,
-            rental_start_date=rental_start_date,
-            rental_end_date=rental_end_date
-        )
+    if not has_active_membership(request.user):
+        messages.error(request, "You must have an active membership to rent a book.")
+        return redirect('membership')
+
+    # Only the columns needed for the rental period and the message
+    # From the primary: a lagging replica could still show a withdrawn title as Available
+    book = get_object_or_404(
+        Book.objects.using(router.db_for_write(Book)).only('id', 'name', 'status', 'rental_days'), id=book_id)
 
+    # Take a copy and record the rental atomically; fails if no copies are left
+    if rent_book_for(request.user, book) is not None:
         messages.success(request, f'You have successfully rented {book.name} for {book.rental_days} days.')
     else:
         messages.error(request, 'This book is already rented or no copies are available.')
 
     return redirect('book_details', book_id=book_id)
 
+
+@login_required
+@require_POST
+def return_book(request, rental_id):
+    rental = get_object_or_404(
+        RentBook.objects.only('id', 'user_id', 'book_id', 'copy_id', 'rental_end_date'), id=rental_id, user=request.user)
+    if return_rental(rental):
+        messages.success(request, 'Thanks, the book has been returned.')
+    else:
+        messages.info(request, 'This book was already returned.')
+    return redirect('view_profile')
+
+
+@login_required
+@require_POST
+def check_in(request, copy_id):
+    # Desk check-in by copy number; only library staff may do this
+    if not request.user.is_staff:
+        raise PermissionDenied("Only library staff can check copies in.")
+    try:
+        checked_in = check_in_copy(copy_id)
+    except BookCopy.DoesNotExist:
+        raise Http404("No such copy.")
+    if checked_in:
+        messages.success(request, f'Copy {copy_id} checked in.')
+    else:
+        messages.info(request, f'Copy {copy_id} was already on the shelf.')
+    return redirect('borrowed_books')
+
 @login_required
 def book_details(request, book_id):
-    book = get_object_or_404(Book, id=book_id)
+    book = get_object_or_404(Book.objects.select_related('author'), id=book_id)
     context = {
         'book': book
     }
     return render(request, 'account/book_details.html', context)
 
 def books_by_genre(request, genre):
-    books = get_list_or_404(Book, genre=genre)
-    return render(request, 'account/genre_books.html', {'genre': genre, 'books': books})
+    books = cached_catalog('genre', lambda: list(Book.objects.for_catalog().filter(genre=genre)), genre)
+    if not books:
+        raise Http404("No books in this genre.")
+    return render(request, 'account/genre_books.html', {
+        'genre': genre,
+        'books': books,
+        'catalog_version': catalog_version(),
+    })
+@login_required
+def book_pdf(request, book_id):
+    # Only readers with a current rental of this book may open its PDF
+    book = get_object_or_404(Book.objects.only('id', 'pdf'), id=book_id)
+    has_rental = RentBook.objects.filter(
+        user=request.user, book_id=book_id, rental_end_date__gte=timezone.now().date(), returned_on__isnull=True).exists()
+    if not has_rental:
+        raise PermissionDenied("You don't have an active rental of this book.")
+    if not book.pdf:
+        raise Http404("No PDF available.")
+    try:
+        path = book.pdf.path
+    except NotImplementedError:
+        # Remote storage: hand out the storage URL instead of streaming through Django
+        return redirect(book.pdf.url)
+    if not os.path.exists(path):
+        raise Http404("No PDF available.")
+    return serve_file(request, path, os.path.basename(book.pdf.name), storage_name=book.pdf.name,
+                      content_type='application/pdf')
+
 @login_required
 def view_profile(request):
     user = request.user
-    profile = get_object_or_404(UserProfile, user=user)
-    rented_books = RentBook.objects.filter(user=user)
+    try:
+        profile = user.userprofile  # comes with the cached request.user
+    except UserProfile.DoesNotExist:
+        raise Http404("No profile for this user.")
 
+    # A fixed number of queries however long the member's history is
     context = {
         'user': user,
         'profile': profile,
-        'rented_books': rented_books,
+        'summary': rental_summary(user),
+        'rented_books': current_rentals(user),
+        'past_rentals': past_rentals(request, user),
+        'membership_active': has_active_membership(user),
     }
 
     return render(request, 'account/view_profile.html', context)
@@ -310,10 +385,14 @@ def admin_login(request):
         # Check for predefined credentials
         if username == 'admin' and password == 'admin123':  # Change to your desired credentials
             # Create or get the admin user
-            admin_user, created = User.objects.get_or_create(username=username)
+            admin_user, created = User.objects.get_or_create(username=username, defaults={'is_staff': True})
             if created:  # If the user was created, set a password
                 admin_user.set_password(password)
                 admin_user.save()
+            elif not admin_user.is_staff:
+                # Staff can check copies in at the desk
+                admin_user.is_staff = True
+                admin_user.save(update_fields=['is_staff'])
 
             # Check if the admin user has a UserProfile, if not, create one
             if not hasattr(admin_user, 'userprofile'):
@@ -330,7 +409,12 @@ def admin_login(request):
 
 # Main Dashboard View
 def admin_dashboard(request):
-    return render(request, 'account/admin_dashboard.html')
+    # Library totals come from the rollup table, not from scanning each table
+    context = {'totals': dashboard_totals()}
+    if settings.SQL_INSTRUMENTATION:
+        # Queries per view since this worker started, worst DB time first
+        context['sql_report'] = sql_stats.report()
+    return render(request, 'account/admin_dashboard.html', context)
 
 # Add Books
 def add_to_collections(request):
@@ -350,35 +434,43 @@ def add_to_collections(request):
     return render(request, 'account/add_book.html', {'form': form})
 
 def search_authors(request):
+    # Answered from the in-memory trigram index instead of an icontains table scan
+    query = request.GET.get('query', '')
+    results = catalog_search.search_authors(query, request.GET.get('limit'))
+    return JsonResponse(results, safe=False)
+
+def search_books(request):
+    # Title / book ID autocomplete, ranked by match quality
     query = request.GET.get('query', '')
-    authors = Author.objects.filter(name__icontains=query)
-    results = [{'name': author.name} for author in authors]
+    results = catalog_search.search_books(query, request.GET.get('limit'))
     return JsonResponse(results, safe=False)
 # Books Catalog
 def books_catalog(request):
-    # Fetch all books from the database
-    books = Book.objects.all()
+    # Fetch one page of books, with authors joined in the same query
+    books = cached_catalog_page(request, 'books_catalog', Book.objects.for_catalog())
     return render(request, 'account/books_catalog.html', {'books': books})
 
 
 def edit_book(request, id):  # Use 'id' instead of 'book_id'
-    book = get_object_or_404(Book, id=id)  # Fetch the book by ID
+    # Read from the primary, and save only the edited field, so neither a lagging
+    # replica nor this stale copy overwrites copies/status changed by a rental
+    book = get_object_or_404(Book.objects.using(router.db_for_write(Book)), id=id)
     if request.method == 'POST':
         # Get the field to update and the new value
         field = request.POST.get('field')
         value = request.POST.get('value')
 
         # Update the selected field with the new value
-        if field and value:
+        if field and value and field in {f.name for f in Book._meta.concrete_fields}:
             setattr(book, field, value)
-            book.save()
+            book.save(update_fields=[field])
             messages.success(request, f"{field.capitalize()} updated successfully!")
             return redirect('books_catalog')
         else:
             messages.error(request, "Failed to update the book!")
 
     # Render the catalog with the editing form
-    books = Book.objects.all()
+    books = cached_catalog_page(request, 'books_catalog', Book.objects.for_catalog())
     return render(request, 'account/books_catalog.html', {
         'books': books,
         'editing': True,  # Indicate that we're in editing mode
@@ -387,7 +479,7 @@ def edit_book(request, id):  # Use 'id' instead of 'book_id'
 
 
 def delete_book(request, id):  # Use 'id' instead of 'book_id'
-    book = get_object_or_404(Book, id=id)  # Use primary key 'id'
+    book = get_object_or_404(Book.objects.using(router.db_for_write(Book)), id=id)  # Use primary key 'id'
     book.delete()
     messages.success(request, "Book deleted successfully!")
     return redirect('books_catalog')
@@ -399,14 +491,22 @@ def user_records(request):
 
 # View for displaying overdue books
 def overdue_books_view(request):
-    # Get books where the rental end date has passed
-    overdue_books = RentBook.objects.filter(rental_end_date__lt=timezone.now().date())
-
-    # Calculate overdue days for each book
-    for rent in overdue_books:
-        rent.overdue_days = (timezone.now().date() - rent.rental_end_date).days
-
-    return render(request, 'account/overduebook.html', {'overdue_books': overdue_books})
+    # The rental-by-rental table stays live: the snapshot only keeps per-user and
+    # per-book totals, and the desk needs to see a return as soon as it happens.
+    # It reads open rentals past their end date from the (returned_on,
+    # rental_end_date) index, so its cost follows the overdue count, not the table.
+    # Overdue days are computed by the database; user and book come from the same query
+    overdue_books = paginate_request(request, overdue_rentals())
+
+    # Per-user / per-book totals come from the precomputed daily snapshot
+    snapshot = latest_snapshot()
+    context = {'overdue_books': overdue_books, 'snapshot': snapshot}
+    if snapshot is not None:
+        rows = snapshot.rows.order_by('-overdue_rentals')
+        context['top_users'] = rows.filter(kind='user')[:10]
+        context['top_books'] = rows.filter(kind='book')[:10]
+
+    return render(request, 'account/overduebook.html', context)
 
 def borrowed_books(request):
     borrowed_books = RentBook.objects.all()  # Fetch all borrowed books
@@ -415,20 +515,84 @@ def borrowed_books(request):
 @login_required
 def user_list_view(request):
     status = request.GET.get('status', 'all')
+    if status not in MEMBER_STATUSES:
+        status = 'all'
+    search = request.GET.get('q', '').strip()
+
+    # One page of the tab, users joined in; the tab counts come from one cached aggregate
+    users = paginate_request(request, member_directory(status, search), 'MEMBER_PAGE_SIZE')
+    filters = urlencode({'status': status, 'q': search} if search else {'status': status})
+    return render(request, 'account/userdetails.html', {
+        'users': users,
+        'status': status,
+        'search': search,
+        'counts': member_counts(search),
+        'filters': filters,
+    })
 
-    # Filter based on subscription status
-    if status == 'subscribed':
-        users = UserProfile.objects.filter(is_subscribed=True)
-    elif status == 'unsubscribed':
-        users = UserProfile.objects.filter(is_subscribed=False)
-    else:
-        users = UserProfile.objects.all()
 
-    return render(request, 'account/userdetails.html', {'users': users, 'status': status})
+
+@login_required
+def export_report(request, report):
+    # Every member's rentals and details; only library staff may download them
+    if not request.user.is_staff:
+        raise PermissionDenied("Only library staff can export reports.")
+    # Streams the report so the first bytes go out before the whole table is read
+    fmt = request.GET.get('format', 'csv')
+    compress = request.GET.get('gzip') in ('1', 'true', 'yes')
+    if report not in REPORTS or fmt not in FORMATS:
+        raise Http404("Unknown report or format.")
+
+    content_type = 'application/gzip' if compress else FORMATS[fmt][0]
+    response = StreamingHttpResponse(stream_report(report, fmt, compress), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(report, fmt, compress)}"'
+    return response
 
 
 
 # Logout Functionality
 def admin_logout(request):
     logout(request)
-    return redirect('account/admin_login')  # Redirect to the login page after logout
\ No newline at end of file
+    return redirect('account/admin_login')  # Redirect to the login page after logout
+
+
+# Async versions of the read-heavy views, routed instead of the ones above when the
+# project runs under ASGI (see ASYNC_VIEWS). A request waiting on the cache or the
+# database then doesn't hold a thread, and cache hits never leave the event loop.
+@login_required
+async def arent_book(request):
+    if not await ahas_active_membership(await request.auser()):
+        messages.error(request, "You must have an active membership to rent a book.")
+        return redirect('membership')
+
+    books = await acached_catalog_page(request, 'rent_book', Book.objects.for_catalog().filter(status='Available'))
+    return render(request, 'account/rent_book.html', {'books': books})
+
+@login_required
+async def abook_details(request, book_id):
+    # The template shows the author, so it has to be joined here: a lazy load would be a sync query
+    book = await aget_object_or_404(Book.objects.select_related('author'), id=book_id)
+    return render(request, 'account/book_details.html', {'book': book})
+
+async def abooks_by_genre(request, genre):
+    async def build():
+        return [book async for book in Book.objects.for_catalog().filter(genre=genre)]
+
+    books = await acached_catalog('genre', build, genre)
+    if not books:
+        raise Http404("No books in this genre.")
+    return render(request, 'account/genre_books.html', {
+        'genre': genre,
+        'books': books,
+        'catalog_version': await acatalog_version(),
+    })
+
+async def asearch_authors(request):
+    query = request.GET.get('query', '')
+    results = await catalog_search.asearch_authors(query, request.GET.get('limit'))
+    return JsonResponse(results, safe=False)
+
+async def asearch_books(request):
+    query = request.GET.get('query', '')
+    results = await catalog_search.asearch_books(query, request.GET.get('limit'))
+    return JsonResponse(results, safe=False)